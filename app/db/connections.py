@@ -1,18 +1,43 @@
+import logging
 import os
+import threading
 import time
-from typing import Dict
-from sqlalchemy import create_engine, text
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from typing import Dict, Tuple
+from sqlalchemy import create_engine
 from sqlalchemy.engine import Engine
 from dotenv import load_dotenv
 
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
 BASE_DSN = os.getenv("BASE_DSN")
 if not BASE_DSN:
     raise RuntimeError("BASE_DSN is not set. Please configure it in your .env file.")
 
 # кеш движков по имени БД
 _engines: Dict[str, Engine] = {}
+# отдельные крошечные пулы только для пингов, чтобы не занимать слоты основного пула
+_health_engines: Dict[str, Engine] = {}
+# защищает создание движков (double-checked locking): попадание в кеш остаётся без блокировки
+_engines_lock = threading.Lock()
+
+# размеры пула для десктоп-приложения: немного соединений, переоткрываем раз в 30 минут
+_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+_POOL_OVERFLOW = int(os.getenv("DB_POOL_OVERFLOW", "2"))
+_POOL_RECYCLE = 1800
+# pre-ping стоит лишний SELECT 1 на каждый checkout; включается явно (DB_POOL_PRE_PING=1)
+# или автоматически, если стартовая проверка нашла проблемы с сетью
+_pool_pre_ping = os.getenv("DB_POOL_PRE_PING", "0") == "1"
+# executemany без RETURNING (UPDATE/DELETE, fallback-вставки) psycopg2 шлёт пачками
+# через execute_batch; INSERT'ы и так склеиваются в multi-row VALUES (insertmanyvalues)
+_EXECUTEMANY_MODE = "values_plus_batch"
+_INSERTMANY_PAGE_SIZE = int(os.getenv("DB_INSERTMANY_PAGE_SIZE", "1000"))
+
+# кеш результатов пинга: dbname -> (время проверки, ok)
+_health_cache: Dict[str, Tuple[float, bool]] = {}
+_HEALTH_TTL = float(os.getenv("HEALTH_TTL_SEC", "5"))
 
 
 def get_engine(dbname: str) -> Engine:
@@ -22,34 +47,109 @@ def get_engine(dbname: str) -> Engine:
     if dbname in _engines:
         return _engines[dbname]
 
-    print("[dbg] BASE_DSN raw:", repr(BASE_DSN))
-    dsn = f"{BASE_DSN}{dbname}"
-    print("[dbg] DSN:", repr(dsn))
-    engine = create_engine(
-        dsn,
-        echo=False,
-        pool_pre_ping=True,             # пинг перед выдачей соединения из пула
-        connect_args={"connect_timeout": 5},
-    )
-    _engines[dbname] = engine
-    return engine
+    with _engines_lock:
+        # повторная проверка: другой поток мог успеть создать движок
+        if dbname in _engines:
+            return _engines[dbname]
+
+        dsn = f"{BASE_DSN}{dbname}"
+        engine = create_engine(
+            dsn,
+            echo=False,
+            pool_size=_POOL_SIZE,
+            max_overflow=_POOL_OVERFLOW,
+            pool_recycle=_POOL_RECYCLE,
+            pool_pre_ping=_pool_pre_ping,
+            executemany_mode=_EXECUTEMANY_MODE,
+            insertmanyvalues_page_size=_INSERTMANY_PAGE_SIZE,
+            connect_args={
+                "connect_timeout": 5,
+                "application_name": "mini_sql_studio",
+                "keepalives": 1,
+                "keepalives_idle": 30,
+            },
+        )
+        # repr(URL) маскирует пароль
+        log.debug("DSN for %s: %r", dbname, engine.url)
+        _engines[dbname] = engine
+        return engine
+
+
+def get_health_engine(dbname: str) -> Engine:
+    """
+    Engine для health-check'ов: пул на одно соединение без overflow.
+    Основной get_engine остаётся для рабочих запросов (PostgresExtractor и т.д.).
+    """
+    if dbname in _health_engines:
+        return _health_engines[dbname]
+
+    with _engines_lock:
+        if dbname in _health_engines:
+            return _health_engines[dbname]
+
+        dsn = f"{BASE_DSN}{dbname}"
+        engine = create_engine(
+            dsn,
+            echo=False,
+            pool_size=1,
+            max_overflow=0,
+            pool_pre_ping=False,
+            pool_recycle=60,
+            pool_reset_on_return=None,    # autocommit → откатывать нечего
+            connect_args={"connect_timeout": 2},
+        )
+        _health_engines[dbname] = engine
+        return engine
+
+
+def test_connection(dbname: str) -> bool:
+    """
+    Пинг базы: выполняет SELECT 1. Возвращает True/False.
+    Установка соединения ограничена connect_timeout health-движка (см. get_health_engine).
+    Результат кешируется на HEALTH_TTL_SEC секунд (см. invalidate_health).
+    """
+    cached = _health_cache.get(dbname)
+    if cached is not None and time.perf_counter() - cached[0] < _HEALTH_TTL:
+        return cached[1]
+
+    ok = _ping(dbname)
+    _health_cache[dbname] = (time.perf_counter(), ok)
+    return ok
 
 
-def test_connection(dbname: str, *, timeout_sql: float = 5.0) -> bool:
+def invalidate_health(dbname: str) -> None:
+    """Сбросить кеш пинга для БД (например, перед явным ресканом)."""
+    _health_cache.pop(dbname, None)
+
+
+def _raw_ping(raw) -> None:
     """
-    Пинг базы: выполняет SELECT 1. Возвращает True/False.
+    Пинг на уровне DBAPI: SELECT 1 на соединении из health-пула в autocommit,
+    без SQLAlchemy Connection/text() и без BEGIN (это не libpq PQping —
+    нужна именно проверка, что сервер выполняет запросы).
+    Пустой запрос psycopg2 отвергает на клиенте, поэтому шлём минимальный SELECT 1.
     """
+    dbapi = raw.dbapi_connection
+    if not dbapi.autocommit:
+        dbapi.autocommit = True
+    with dbapi.cursor() as cur:
+        cur.execute("SELECT 1")
+
+
+def _ping(dbname: str) -> bool:
     try:
-        eng = get_engine(dbname)
+        eng = get_health_engine(dbname)
         t0 = time.perf_counter()
-        with eng.connect() as conn:
-            # лёгкий пинг
-            conn.execute(text("SELECT 1"))
+        raw = eng.raw_connection()
+        try:
+            _raw_ping(raw)
+        finally:
+            raw.close()  # вернуть соединение в пул
         dt = (time.perf_counter() - t0) * 1000
-        print(f"[db] OK  '{dbname}' ({dt:.1f} ms)")
+        log.info("OK  '%s' (%.1f ms)", dbname, dt)
         return True
     except Exception as e:
-        print(f"[db] ERR '{dbname}': {e}")
+        log.warning("ERR '%s': %s", dbname, e)
         return False
 
 
@@ -72,19 +172,38 @@ def startup_healthcheck():
     if not dbs:
         return
 
-    print(f"[startup] health check for: {', '.join(dbs)}")
+    log.info("startup health check for: %s", ", ".join(dbs))
     failures = 0
-    for db in dbs:
-        ok = test_connection(db)
-        if not ok:
-            failures += 1
+    timeout = float(os.getenv("STARTUP_CHECK_TIMEOUT", "5"))
+    # пингуем параллельно: общее время ~ max(RTT), а не сумма
+    ex = ThreadPoolExecutor(max_workers=min(len(dbs), 16))
+    try:
+        futs = {ex.submit(test_connection, db): db for db in dbs}
+        pending = set(futs)
+        try:
+            for fut in as_completed(futs, timeout=timeout):
+                pending.discard(fut)
+                if not fut.result():
+                    failures += 1
+        except FuturesTimeout:
+            # не дождались — считаем оставшиеся проверки неуспешными
+            for fut in pending:
+                log.warning("startup health check timed out for '%s'", futs[fut])
+            failures += len(pending)
+    finally:
+        # не блокируем старт на зависших пингах
+        ex.shutdown(wait=False, cancel_futures=True)
 
     if failures:
+        # сеть нестабильна — пусть пул проверяет соединения перед выдачей
+        global _pool_pre_ping
+        _pool_pre_ping = True
+
         msg = f"[startup] {failures} connection(s) failed"
         if os.getenv("STARTUP_STRICT", "0") == "1":
             raise RuntimeError(msg)
         else:
-            print(msg)
+            log.warning(msg)
 
 
 # запустить автопроверку при импорте модуля
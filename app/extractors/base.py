@@ -1,17 +1,29 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional, TypedDict, Tuple, Iterable
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple, Iterable
 
 
 # ---- типизированные структуры данных
+# dataclass(slots=True): без per-row dict, компактнее и быстрее доступ к полям.
+# В dict переводим только на границах сериализации (as_dict()).
 
-class TableInfo(TypedDict):
+class _Record:
+    __slots__ = ()
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass(slots=True)
+class TableInfo(_Record):
     schema: str           # схема, к которой принадлежит таблица
     table_name: str       # имя таблицы
     table_type: str       # тип таблицы: 'BASE TABLE', 'VIEW' или др.
 
 
-class ColumnInfo(TypedDict, total=False):
+@dataclass(slots=True)
+class ColumnInfo(_Record):
     name: str                     # имя колонки
     data_type: str                # тип данных (например: "numeric(10,2)" или "timestamp with time zone")
     is_nullable: bool             # может ли колонка быть NULL
@@ -19,13 +31,15 @@ class ColumnInfo(TypedDict, total=False):
     default: Optional[str] = None # значение по умолчанию (если есть)
 
 
-class PrimaryKeyInfo(TypedDict):
+@dataclass(slots=True)
+class PrimaryKeyInfo(_Record):
     constraint_name: str           # имя ограничения первичного ключа
     columns: List[str]             # список колонок, входящих в первичный ключ (в порядке определения)
     ordinal_positions: List[int]   # порядковые позиции тех же колонок
 
 
-class ForeignKeyInfo(TypedDict):
+@dataclass(slots=True)
+class ForeignKeyInfo(_Record):
     constraint_name: str             # имя ограничения внешнего ключа
     columns: List[str]               # список исходных колонок (в таблице-источнике)
     referenced_schema: str           # схема, на которую ссылается внешний ключ
@@ -34,13 +48,21 @@ class ForeignKeyInfo(TypedDict):
     column_pairs: List[Tuple[str, str]]  # отображение пар (исходная -> целевая колонка)
 
 
+@dataclass(slots=True)
+class TableSchema(_Record):
+    table: TableInfo                      # сама таблица/представление
+    columns: List[ColumnInfo]             # колонки в порядке следования
+    primary_keys: List[PrimaryKeyInfo]    # первичные ключи таблицы
+    foreign_keys: List[ForeignKeyInfo]    # внешние ключи таблицы
+
+
 class BaseExtractor(ABC):
     """
     Абстрактный базовый класс для извлечения метаданных из разных СУБД
     (Postgres / MySQL / MSSQL и т.д.).
 
     Реализации этого класса должны возвращать нормализованные,
-    независимые от СУБД структуры данных (см. TypedDict выше).
+    независимые от СУБД структуры данных (см. dataclass'ы выше).
     """
 
     def __init__(self, conn_params: Dict[str, Any]):
@@ -135,5 +157,29 @@ class BaseExtractor(ABC):
         schemas: Optional[List[str]] = None,
         include_system_schemas: bool = False,
     ) -> Iterable[TableInfo]:
-       
-        return iter(self.list_tables(database, schemas=schemas, include_system_schemas=include_system_schemas))
+        """
+        генератор таблиц; по умолчанию поверх list_tables, реализации
+        могут переопределить его для настоящей потоковой выдачи.
+        """
+        yield from self.list_tables(database, schemas=schemas, include_system_schemas=include_system_schemas)
+
+    # ---- полная схема за один проход ----
+    def extract_schema(
+        self,
+        schemas: Optional[List[str]] = None,
+    ) -> Dict[Tuple[str, str], TableSchema]:
+        """
+        Возвращает все метаданные по таблицам: (schema, table) -> TableSchema.
+        Базовая реализация ходит в БД по таблице; реализации могут переопределить
+        метод и читать каталог пакетно.
+        """
+        result: Dict[Tuple[str, str], TableSchema] = {}
+        for t in self.list_tables(schemas=schemas):
+            s, name = t.schema, t.table_name
+            result[(s, name)] = TableSchema(
+                table=t,
+                columns=self.list_columns(s, name),
+                primary_keys=self.list_primary_keys(s, name),
+                foreign_keys=self.list_foreign_keys(s, name),
+            )
+        return result
@@ -1,8 +1,14 @@
 from __future__ import annotations
-from typing import Any, Dict, List, Optional
+import itertools
+import os
+import re
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 import psycopg2
-from psycopg2.extensions import connection as PGConnection
 from ..db.connections import get_engine
 
 from .base import (
@@ -11,8 +17,285 @@ from .base import (
     ColumnInfo,
     PrimaryKeyInfo,
     ForeignKeyInfo,
+    TableSchema,
 )
 
+# размер пачки для server-side курсоров
+_ITERSIZE = 2000
+# верхняя граница на любой запрос к каталогу
+_STATEMENT_TIMEOUT_MS = int(os.getenv("META_STATEMENT_TIMEOUT_MS", "5000"))
+# уникальные имена named cursor'ов в пределах процесса
+_cursor_seq = itertools.count()
+# extract_schema: таблицы, колонки, PK и FK читаются параллельно на разных соединениях пула
+_EXTRACT_WORKERS = 4
+
+
+# ---- статический SQL: строится один раз при импорте модуля ----
+
+_SQL_COLUMNS_BULK = """
+    SELECT
+        n.nspname AS table_schema,
+        c.relname AS table_name,
+        a.attnum AS ordinal_position,
+        a.attname AS column_name,
+        a.atttypid,
+        a.atttypmod,
+        NOT a.attnotnull AS is_nullable,
+        pg_catalog.pg_get_expr(ad.adbin, ad.adrelid) AS column_default
+    FROM pg_catalog.pg_attribute a
+    JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_catalog.pg_attrdef ad
+      ON ad.adrelid = a.attrelid AND ad.adnum = a.attnum
+    WHERE n.nspname = ANY(%s::text[])
+      AND c.relkind IN ('r','v','m','p','f')
+      AND a.attnum > 0
+      AND NOT a.attisdropped
+    ORDER BY n.nspname, c.relname, a.attnum
+"""
+
+_SQL_PK = """
+    SELECT
+        tc.constraint_name,
+        kcu.column_name,
+        kcu.ordinal_position
+    FROM information_schema.table_constraints AS tc
+    JOIN information_schema.key_column_usage AS kcu
+      ON tc.constraint_name = kcu.constraint_name
+     AND tc.table_schema   = kcu.table_schema
+    WHERE tc.constraint_type = 'PRIMARY KEY'
+      AND tc.table_schema = %s
+      AND tc.table_name   = %s
+    ORDER BY kcu.ordinal_position
+"""
+
+_SQL_FK = """
+    SELECT
+        con.conname AS constraint_name,
+        src_ns.nspname AS src_schema,
+        src_rel.relname AS src_table,
+        tgt_ns.nspname AS tgt_schema,
+        tgt_rel.relname AS tgt_table,
+        src_att.attname AS src_col,
+        tgt_att.attname AS tgt_col,
+        ord.n AS position
+    FROM pg_constraint con
+    JOIN pg_class src_rel ON con.conrelid = src_rel.oid
+    JOIN pg_namespace src_ns ON src_rel.relnamespace = src_ns.oid
+    JOIN pg_class tgt_rel ON con.confrelid = tgt_rel.oid
+    JOIN pg_namespace tgt_ns ON tgt_rel.relnamespace = tgt_ns.oid
+    JOIN LATERAL generate_subscripts(con.conkey, 1) AS ord(n) ON TRUE
+    LEFT JOIN pg_attribute src_att
+      ON src_att.attrelid = src_rel.oid AND src_att.attnum = con.conkey[ord.n]
+    LEFT JOIN pg_attribute tgt_att
+      ON tgt_att.attrelid = tgt_rel.oid AND tgt_att.attnum = con.confkey[ord.n]
+    WHERE con.contype = 'f'
+      AND src_ns.nspname = %s
+      AND src_rel.relname = %s
+    ORDER BY con.conname, ord.n
+"""
+
+_SQL_PK_BULK = """
+    SELECT
+        tc.table_schema,
+        tc.table_name,
+        tc.constraint_name,
+        kcu.column_name,
+        kcu.ordinal_position
+    FROM information_schema.table_constraints AS tc
+    JOIN information_schema.key_column_usage AS kcu
+      ON tc.constraint_name = kcu.constraint_name
+     AND tc.table_schema   = kcu.table_schema
+    WHERE tc.constraint_type = 'PRIMARY KEY'
+      AND tc.table_schema = ANY(%s::text[])
+    ORDER BY tc.table_schema, tc.table_name, kcu.ordinal_position
+"""
+
+_SQL_FK_BULK = """
+    SELECT
+        con.conname AS constraint_name,
+        src_ns.nspname AS src_schema,
+        src_rel.relname AS src_table,
+        tgt_ns.nspname AS tgt_schema,
+        tgt_rel.relname AS tgt_table,
+        src_att.attname AS src_col,
+        tgt_att.attname AS tgt_col,
+        ord.n AS position
+    FROM pg_constraint con
+    JOIN pg_class src_rel ON con.conrelid = src_rel.oid
+    JOIN pg_namespace src_ns ON src_rel.relnamespace = src_ns.oid
+    JOIN pg_class tgt_rel ON con.confrelid = tgt_rel.oid
+    JOIN pg_namespace tgt_ns ON tgt_rel.relnamespace = tgt_ns.oid
+    JOIN LATERAL generate_subscripts(con.conkey, 1) AS ord(n) ON TRUE
+    LEFT JOIN pg_attribute src_att
+      ON src_att.attrelid = src_rel.oid AND src_att.attnum = con.conkey[ord.n]
+    LEFT JOIN pg_attribute tgt_att
+      ON tgt_att.attrelid = tgt_rel.oid AND tgt_att.attnum = con.confkey[ord.n]
+    WHERE con.contype = 'f'
+      AND src_ns.nspname = ANY(%s::text[])
+    ORDER BY src_ns.nspname, src_rel.relname, con.conname, ord.n
+"""
+
+
+# те же пакетные запросы, но по всем несистемным схемам (как list_tables по умолчанию)
+_USER_SCHEMAS = "NOT IN ('pg_catalog','information_schema')"
+_SQL_COLUMNS_ALL = _SQL_COLUMNS_BULK.replace("n.nspname = ANY(%s::text[])", f"n.nspname {_USER_SCHEMAS}")
+_SQL_PK_ALL = _SQL_PK_BULK.replace("tc.table_schema = ANY(%s::text[])", f"tc.table_schema {_USER_SCHEMAS}")
+_SQL_FK_ALL = _SQL_FK_BULK.replace("src_ns.nspname = ANY(%s::text[])", f"src_ns.nspname {_USER_SCHEMAS}")
+
+# format_type для типов, которые не удалось отформатировать на клиенте
+_SQL_FORMAT_TYPES = """
+    SELECT t.oid, t.mod, pg_catalog.format_type(t.oid, t.mod)
+    FROM unnest(%s::oid[], %s::int4[]) AS t(oid, mod)
+"""
+
+
+def _to_positional(sql: str) -> str:
+    """'%s'-плейсхолдеры psycopg2 -> $1, $2, ... для PREPARE."""
+    seq = itertools.count(1)
+    return re.sub(r"%s", lambda _m: f"${next(seq)}", sql)
+
+
+# серверные prepared statements для частых per-table запросов:
+# имя -> (текст для PREPARE, типы параметров)
+_PREPARED: Dict[str, Tuple[str, str]] = {
+    "meta_pk": (_to_positional(_SQL_PK), "text, text"),
+    "meta_fk": (_to_positional(_SQL_FK), "text, text"),
+}
+
+
+def _tables_sql(include_system_schemas: bool, has_schemas: bool) -> str:
+    """Собрать текст запроса list_tables для заданной комбинации фильтров."""
+    where = []
+    if not include_system_schemas:
+        where.append("table_schema NOT IN ('pg_catalog','information_schema')")
+    if has_schemas:
+        where.append("table_schema = ANY(%s)")
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+    return f"""
+    SELECT table_schema, table_name, table_type
+    FROM information_schema.tables
+    {where_sql}
+    ORDER BY table_schema, table_name
+"""
+
+
+# все четыре варианта list_tables: (include_system_schemas, has_schemas) -> SQL
+_SQL_TABLES: Dict[Tuple[bool, bool], str] = {
+    (sys_, has): _tables_sql(sys_, has)
+    for sys_ in (False, True)
+    for has in (False, True)
+}
+
+
+# ---- форматирование типов на клиенте (как pg_catalog.format_type) ----
+
+# встроенные типы с фиксированными OID, у которых typmod не влияет на имя
+_FIXED_TYPE_NAMES: Dict[int, str] = {
+    16: "boolean",
+    17: "bytea",
+    20: "bigint",
+    21: "smallint",
+    23: "integer",
+    25: "text",
+    114: "json",
+    700: "real",
+    701: "double precision",
+    1082: "date",
+    2950: "uuid",
+    3802: "jsonb",
+}
+
+
+def _fmt_varchar(mod: int) -> str:
+    return f"character varying({mod - 4})"
+
+
+def _fmt_numeric(mod: int) -> str:
+    # как numeric_typmod_scale() в PG15+: scale — 11-битное знаковое число,
+    # numeric(5,-2) хранится как 0x7FE в младших битах
+    mod -= 4
+    scale = ((mod & 0x7FF) ^ 0x400) - 0x400
+    return f"numeric({(mod >> 16) & 0xFFFF},{scale})"
+
+
+# типы, имя которых зависит от typmod: oid -> (имя без typmod, форматтер с typmod)
+_MOD_TYPE_FORMATTERS = {
+    1043: ("character varying", _fmt_varchar),
+    1700: ("numeric", _fmt_numeric),
+    1114: ("timestamp without time zone", lambda mod: f"timestamp({mod}) without time zone"),
+    1184: ("timestamp with time zone", lambda mod: f"timestamp({mod}) with time zone"),
+}
+
+
+def _format_type(oid: int, typmod: int) -> Optional[str]:
+    """Имя типа для частых OID без вызова format_type на сервере; None — неизвестный тип."""
+    name = _FIXED_TYPE_NAMES.get(oid)
+    if name is not None:
+        return name
+    fmt = _MOD_TYPE_FORMATTERS.get(oid)
+    if fmt is None:
+        return None
+    return fmt[0] if typmod < 0 else fmt[1](typmod)
+
+
+def _build_primary_keys(rows: Iterable[Tuple[str, str, int]]) -> List[PrimaryKeyInfo]:
+    """Собрать PrimaryKeyInfo из строк (constraint_name, column_name, ordinal_position)."""
+    # defaultdict сохраняет порядок первого появления ограничения
+    cols: Dict[str, List[str]] = defaultdict(list)
+    poss: Dict[str, List[int]] = defaultdict(list)
+    for name, col, pos in rows:
+        cols[name].append(col)
+        poss[name].append(int(pos))
+
+    return [
+        PrimaryKeyInfo(constraint_name=name, columns=c, ordinal_positions=poss[name])
+        for name, c in cols.items()
+    ]
+
+
+def _build_foreign_keys(rows: Iterable[Tuple[str, str, str, str, str]]) -> List[ForeignKeyInfo]:
+    """Собрать ForeignKeyInfo из строк (constraint_name, tgt_schema, tgt_table, src_col, tgt_col)."""
+    cols: Dict[str, List[str]] = defaultdict(list)
+    refs: Dict[str, List[str]] = defaultdict(list)
+    # пары src->tgt собираем сразу: строки уже упорядочены по (conname, ord.n)
+    pairs: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+    targets: Dict[str, Tuple[str, str]] = {}
+    for name, tgt_schema, tgt_table, src_col, tgt_col in rows:
+        if name not in targets:
+            targets[name] = (tgt_schema, tgt_table)
+        cols[name].append(src_col)
+        refs[name].append(tgt_col)
+        pairs[name].append((src_col, tgt_col))
+
+    return [
+        ForeignKeyInfo(
+            constraint_name=name,
+            columns=cols[name],
+            referenced_schema=tgt_schema,
+            referenced_table=tgt_table,
+            referenced_columns=refs[name],
+            column_pairs=pairs[name],
+        )
+        for name, (tgt_schema, tgt_table) in targets.items()
+    ]
+
+
+def _group_primary_keys(rows: Iterable[tuple]) -> Dict[Tuple[str, str], List[PrimaryKeyInfo]]:
+    """Строки _SQL_PK_BULK/_SQL_PK_ALL -> {(schema, table): [PrimaryKeyInfo]}."""
+    grouped: Dict[Tuple[str, str], list] = defaultdict(list)
+    for schema, table, name, col, pos in rows:
+        grouped[(schema, table)].append((name, col, pos))
+    return {key: _build_primary_keys(items) for key, items in grouped.items()}
+
+
+def _group_foreign_keys(rows: Iterable[tuple]) -> Dict[Tuple[str, str], List[ForeignKeyInfo]]:
+    """Строки _SQL_FK_BULK/_SQL_FK_ALL -> {(schema, table): [ForeignKeyInfo]}."""
+    grouped: Dict[Tuple[str, str], list] = defaultdict(list)
+    for name, src_schema, src_table, tgt_schema, tgt_table, src_col, tgt_col, _pos in rows:
+        grouped[(src_schema, src_table)].append((name, tgt_schema, tgt_table, src_col, tgt_col))
+    return {key: _build_foreign_keys(items) for key, items in grouped.items()}
+
 
 class PostgresExtractor(BaseExtractor):
     """
@@ -27,38 +310,61 @@ class PostgresExtractor(BaseExtractor):
         """
         super().__init__(conn_params)
         self._engine = None
-        self.conn: Optional[PGConnection] = None
-        self.cursor = None
+        # колонки, уже прочитанные пакетно: (schema, table) -> [ColumnInfo]
+        self._columns_cache: Dict[Tuple[str, str], List[ColumnInfo]] = {}
+        self._columns_loaded: Set[str] = set()
+        # list_columns можно звать из нескольких потоков (соединения берутся на вызов)
+        self._columns_lock = threading.Lock()
 
     def connect(self) -> None:
-        if self.conn is not None:
+        if self._engine is not None:
             return
         dbname = self.conn_params["dbname"]  # обязательный ключ
         self._engine = get_engine(dbname)    # общий пул
-        # берём raw psycopg2 connection, чтобы работать с cursor как раньше
-        raw = self._engine.raw_connection()
-        # на всякий случай включим autocommit для read-only SELECT’ов
-        try:
-            raw.autocommit = True
-        except Exception:
-            pass
-        self.conn = raw
-        self.cursor = raw.cursor()
 
     def close(self) -> None:
-        if self.cursor:
-            try:
-                self.cursor.close()
-            except Exception:
-                pass
-        if self.conn:
-            try:
-                self.conn.close()
-            except Exception:
-                pass
-        self.cursor = None
-        self.conn = None
+        # соединения берутся из пула на время одного вызова — держать нечего
         self._engine = None
+        self._columns_cache.clear()
+        self._columns_loaded.clear()
+
+    @contextmanager
+    def _transient(self) -> Iterator[Any]:
+        """
+        Raw psycopg2-соединение из пула на один вызов, с statement_timeout.
+        SET LOCAL действует только до конца транзакции: откат при возврате
+        в пул сбрасывает его, и таймаут не "протекает" в чужие запросы.
+        """
+        self.connect()
+        raw = self._engine.raw_connection()
+        try:
+            with raw.cursor() as cur:
+                cur.execute("SET LOCAL statement_timeout = %s", (_STATEMENT_TIMEOUT_MS,))
+            yield raw
+        finally:
+            raw.close()  # вернуть в пул (с rollback)
+
+    def _exec(self, sql: str, params: Any = None) -> List[tuple]:
+        """Выполнить запрос на коротко живущем соединении и вернуть все строки."""
+        with self._transient() as raw, raw.cursor() as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+    def _exec_prepared(self, name: str, params: Tuple[Any, ...]) -> List[tuple]:
+        """
+        EXECUTE заранее подготовленного запроса (см. _PREPARED).
+        PREPARE живёт в сессии, поэтому выполняется один раз на физическое
+        соединение пула; отметка хранится в raw.info и пропадает при переподключении.
+        """
+        with self._transient() as raw, raw.cursor() as cur:
+            prepared = raw.info.setdefault("meta_prepared", set())
+            if name not in prepared:
+                sql, argtypes = _PREPARED[name]
+                cur.execute(f"PREPARE {name} ({argtypes}) AS {sql}")
+                prepared.add(name)
+            placeholders = ", ".join(["%s"] * len(params))
+            cur.execute(f"EXECUTE {name} ({placeholders})", params)
+            return cur.fetchall()
 
     # --- API из BaseExtractor -------------------------------------------------
 
@@ -73,163 +379,185 @@ class PostgresExtractor(BaseExtractor):
         Возвращает список таблиц/представлений.
         Параметр database игнорируем (мы уже подключены к конкретной БД).
         """
-        self.connect()
-
-        where = []
-        params: List[Any] = []
+        return list(self.iter_tables(
+            database, schemas=schemas, include_system_schemas=include_system_schemas,
+        ))
 
-        if not include_system_schemas:
-            where.append("table_schema NOT IN ('pg_catalog','information_schema')")
+    def iter_tables(
+        self,
+        database: Optional[str] = None,
+        *,
+        schemas: Optional[List[str]] = None,
+        include_system_schemas: bool = False,
+    ) -> Iterator[TableInfo]:
+        """
+        Потоковая выдача таблиц через server-side (named) cursor:
+        строки приходят пачками по _ITERSIZE, без промежуточного списка.
+        """
+        sql = _SQL_TABLES[(include_system_schemas, bool(schemas))]
+        params = (schemas,) if schemas else None
 
-        if schemas:
-            where.append("table_schema = ANY(%s)")
-            params.append(schemas)
+        name = f"tbl_{id(self)}_{next(_cursor_seq)}"
+        with self._transient() as raw, raw.cursor(name=name) as cur:
+            cur.itersize = _ITERSIZE
+            cur.execute(sql, params)
+            for r in cur:
+                yield TableInfo(r[0], r[1], r[2])
 
-        where_sql = ("WHERE " + " AND ".join(where)) if where else ""
-        sql = f"""
-            SELECT table_schema, table_name, table_type
-            FROM information_schema.tables
-            {where_sql}
-            ORDER BY table_schema, table_name
+    def list_tables_arrow(
+        self,
+        *,
+        schemas: Optional[List[str]] = None,
+        include_system_schemas: bool = False,
+    ):
         """
+        То же, что list_tables, но колоночно: pyarrow.Table с колонками
+        schema / table_name / table_type (для сортировки/фильтрации через pyarrow.compute).
+        pyarrow — опциональная зависимость, импортируется только здесь.
+        """
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise RuntimeError("list_tables_arrow() requires the 'pyarrow' package") from e
 
-        self.cursor.execute(sql, params or None)
-        rows = self.cursor.fetchall()
-
-        return [
-            TableInfo(schema=r[0], table_name=r[1], table_type=r[2])
-            for r in rows
-        ]
+        sql = _SQL_TABLES[(include_system_schemas, bool(schemas))]
+        rows = self._exec(sql, (schemas,) if schemas else None)
+        cols = list(zip(*rows)) if rows else [(), (), ()]
+        return pa.table({
+            "schema": pa.array(cols[0], type=pa.string()),
+            "table_name": pa.array(cols[1], type=pa.string()),
+            "table_type": pa.array(cols[2], type=pa.string()),
+        })
 
     def list_columns(self, table_schema: str, table_name: str) -> List[ColumnInfo]:
         """
         Колонки с типами, nullability и default; с порядком.
+        Читаются пакетно сразу для всей схемы (см. list_columns_bulk) и кешируются
+        до close(), так что обход таблиц одной схемы стоит один запрос.
         """
-        self.connect()
+        if table_schema not in self._columns_loaded:
+            with self._columns_lock:
+                if table_schema not in self._columns_loaded:
+                    self._columns_cache.update(self.list_columns_bulk([table_schema]))
+                    self._columns_loaded.add(table_schema)
+        return list(self._columns_cache.get((table_schema, table_name), []))
+
+    def list_columns_bulk(self, schemas: List[str]) -> Dict[Tuple[str, str], List[ColumnInfo]]:
+        """
+        Колонки всех таблиц/представлений указанных схем одним запросом.
+        Результат сгруппирован по (schema, table), колонки — в порядке attnum.
+        """
+        return self._group_columns(self._exec(_SQL_COLUMNS_BULK, (list(schemas),)))
+
+    def list_all_columns(self) -> Dict[Tuple[str, str], List[ColumnInfo]]:
+        """Колонки всех таблиц всех несистемных схем одним запросом."""
+        return self._group_columns(self._exec(_SQL_COLUMNS_ALL))
+
+    def _group_columns(self, rows: List[tuple]) -> Dict[Tuple[str, str], List[ColumnInfo]]:
+        """Строки _SQL_COLUMNS_* -> {(schema, table): [ColumnInfo]}."""
+        # частые типы форматируем локально, остальные — одним доп. запросом
+        type_names: Dict[Tuple[int, int], str] = {}
+        unknown: Set[Tuple[int, int]] = set()
+        for r in rows:
+            key = (r[4], r[5])
+            if key in type_names or key in unknown:
+                continue
+            name = _format_type(*key)
+            if name is None:
+                unknown.add(key)
+            else:
+                type_names[key] = name
+        if unknown:
+            oids, mods = zip(*unknown)
+            for oid, mod, name in self._exec(_SQL_FORMAT_TYPES, (list(oids), list(mods))):
+                type_names[(oid, mod)] = name
 
-        sql = """
-            SELECT
-                a.attnum AS ordinal_position,
-                a.attname AS column_name,
-                pg_catalog.format_type(a.atttypid, a.atttypmod) AS formatted_type,
-                NOT a.attnotnull AS is_nullable,
-                pg_catalog.pg_get_expr(ad.adbin, ad.adrelid) AS column_default
-            FROM pg_catalog.pg_attribute a
-            JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
-            JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
-            LEFT JOIN pg_catalog.pg_attrdef ad
-              ON ad.adrelid = a.attrelid AND ad.adnum = a.attnum
-            WHERE n.nspname = %s
-              AND c.relname = %s
-              AND a.attnum > 0
-              AND NOT a.attisdropped
-            ORDER BY a.attnum
-        """
-        self.cursor.execute(sql, (table_schema, table_name))
-        rows = self.cursor.fetchall()
-
-        return [
-            ColumnInfo(
-                name=r[1],
-                data_type=r[2],
-                is_nullable=bool(r[3]),
-                ordinal_position=int(r[0]),
-                default=r[4],
+        result: Dict[Tuple[str, str], List[ColumnInfo]] = defaultdict(list)
+        for r in rows:
+            # позиционно: (name, data_type, is_nullable, ordinal_position, default)
+            result[(r[0], r[1])].append(
+                ColumnInfo(r[3], type_names[(r[4], r[5])], bool(r[6]), int(r[2]), r[7])
             )
-            for r in rows
-        ]
+        return dict(result)
 
     def list_primary_keys(self, table_schema: str, table_name: str) -> List[PrimaryKeyInfo]:
         """
         Описание PK (обычно одно на таблицу), с упорядоченными колонками.
         """
-        self.connect()
-
-        sql = """
-            SELECT
-                tc.constraint_name,
-                kcu.column_name,
-                kcu.ordinal_position
-            FROM information_schema.table_constraints AS tc
-            JOIN information_schema.key_column_usage AS kcu
-              ON tc.constraint_name = kcu.constraint_name
-             AND tc.table_schema   = kcu.table_schema
-            WHERE tc.constraint_type = 'PRIMARY KEY'
-              AND tc.table_schema = %s
-              AND tc.table_name   = %s
-            ORDER BY kcu.ordinal_position
-        """
-        with self.conn.cursor() as cur:
-            cur.execute(sql, (table_schema, table_name))
-            rows = cur.fetchall()
-
-        if not rows:
-            return []
-
-        acc: dict[str, PrimaryKeyInfo] = {}
-        for name, col, pos in rows:
-            if name not in acc:
-                acc[name] = PrimaryKeyInfo(
-                    constraint_name=name,
-                    columns=[],
-                    ordinal_positions=[],
-                )
-            acc[name]["columns"].append(col)
-            acc[name]["ordinal_positions"].append(int(pos))
-
-        return list(acc.values())
+        rows = self._exec_prepared("meta_pk", (table_schema, table_name))
+        return _build_primary_keys(rows)
 
     def list_foreign_keys(self, table_schema: str, table_name: str) -> List[ForeignKeyInfo]:
         """
         Описание FK с сохранением порядка колонок и картой src->tgt.
         """
+        rows = self._exec_prepared("meta_fk", (table_schema, table_name))
+        return _build_foreign_keys(
+            (name, tgt_schema, tgt_table, src_col, tgt_col)
+            for name, _ss, _st, tgt_schema, tgt_table, src_col, tgt_col, _pos in rows
+        )
+
+    # --- пакетное чтение каталога ----------------------------------------------
+
+    def list_primary_keys_bulk(self, schemas: List[str]) -> Dict[Tuple[str, str], List[PrimaryKeyInfo]]:
+        """
+        PK всех таблиц указанных схем одним запросом, сгруппированные по (schema, table).
+        """
+        return _group_primary_keys(self._exec(_SQL_PK_BULK, (list(schemas),)))
+
+    def list_all_primary_keys(self) -> Dict[Tuple[str, str], List[PrimaryKeyInfo]]:
+        """PK всех таблиц всех несистемных схем одним запросом."""
+        return _group_primary_keys(self._exec(_SQL_PK_ALL))
+
+    def list_foreign_keys_bulk(self, schemas: List[str]) -> Dict[Tuple[str, str], List[ForeignKeyInfo]]:
+        """
+        FK всех таблиц указанных схем одним запросом, сгруппированные по (schema, table).
+        """
+        return _group_foreign_keys(self._exec(_SQL_FK_BULK, (list(schemas),)))
+
+    def list_all_foreign_keys(self) -> Dict[Tuple[str, str], List[ForeignKeyInfo]]:
+        """FK всех таблиц всех несистемных схем одним запросом."""
+        return _group_foreign_keys(self._exec(_SQL_FK_ALL))
+
+    def extract_schema(
+        self,
+        schemas: Optional[List[str]] = None,
+    ) -> Dict[Tuple[str, str], TableSchema]:
+        """
+        Полная схема за 4 запроса (таблицы, колонки, PK, FK) вместо 1 + 3N.
+        Если schemas не задан — берутся все несистемные схемы (list_all_*).
+
+        Запросы независимы и идут параллельно: каждый вызов берёт своё
+        соединение из пула (_transient), так что время ≈ самому медленному.
+        """
+        if schemas:
+            calls = (
+                (self.list_columns_bulk, schemas),
+                (self.list_primary_keys_bulk, schemas),
+                (self.list_foreign_keys_bulk, schemas),
+            )
+        else:
+            calls = (
+                (self.list_all_columns,),
+                (self.list_all_primary_keys,),
+                (self.list_all_foreign_keys,),
+            )
         self.connect()
+        with ThreadPoolExecutor(max_workers=_EXTRACT_WORKERS, thread_name_prefix="extract") as pool:
+            tables_f = pool.submit(self.list_tables, schemas=schemas)
+            futures = [pool.submit(*call) for call in calls]
+            tables = tables_f.result()
+            columns, pks, fks = (f.result() for f in futures)
+        if not tables:
+            return {}
 
-        sql = """
-            SELECT
-                con.conname AS constraint_name,
-                src_ns.nspname AS src_schema,
-                src_rel.relname AS src_table,
-                tgt_ns.nspname AS tgt_schema,
-                tgt_rel.relname AS tgt_table,
-                src_att.attname AS src_col,
-                tgt_att.attname AS tgt_col,
-                ord.n AS position
-            FROM pg_constraint con
-            JOIN pg_class src_rel ON con.conrelid = src_rel.oid
-            JOIN pg_namespace src_ns ON src_rel.relnamespace = src_ns.oid
-            JOIN pg_class tgt_rel ON con.confrelid = tgt_rel.oid
-            JOIN pg_namespace tgt_ns ON tgt_rel.relnamespace = tgt_ns.oid
-            JOIN LATERAL generate_subscripts(con.conkey, 1) AS ord(n) ON TRUE
-            LEFT JOIN pg_attribute src_att
-              ON src_att.attrelid = src_rel.oid AND src_att.attnum = con.conkey[ord.n]
-            LEFT JOIN pg_attribute tgt_att
-              ON tgt_att.attrelid = tgt_rel.oid AND tgt_att.attnum = con.confkey[ord.n]
-            WHERE con.contype = 'f'
-              AND src_ns.nspname = %s
-              AND src_rel.relname = %s
-            ORDER BY con.conname, ord.n
-        """
-        with self.conn.cursor() as cur:
-            cur.execute(sql, (table_schema, table_name))
-            rows = cur.fetchall()
-
-        fks: dict[str, ForeignKeyInfo] = {}
-        for name, _ss, _st, tgt_schema, tgt_table, src_col, tgt_col, _pos in rows:
-            if name not in fks:
-                fks[name] = ForeignKeyInfo(
-                    constraint_name=name,
-                    columns=[],
-                    referenced_schema=tgt_schema,
-                    referenced_table=tgt_table,
-                    referenced_columns=[],
-                    column_pairs=[],
-                )
-            fks[name]["columns"].append(src_col)
-            fks[name]["referenced_columns"].append(tgt_col)
-
-        # дополним явной парой src->tgt, сохраняя порядок
-        for fk in fks.values():
-            fk["column_pairs"] = list(zip(fk["columns"], fk["referenced_columns"]))
-
-        return list(fks.values())
+        result: Dict[Tuple[str, str], TableSchema] = {}
+        for t in tables:
+            key = (t.schema, t.table_name)
+            result[key] = TableSchema(
+                table=t,
+                columns=columns.get(key, []),
+                primary_keys=pks.get(key, []),
+                foreign_keys=fks.get(key, []),
+            )
+        return result
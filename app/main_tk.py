@@ -1,9 +1,9 @@
 import tkinter as tk
-from tkinter import ttk
+from tkinter import ttk, messagebox
 
 
 from app.repositories.meta_repository import MetaRepository
-from app.services.query_service import QueryService
+from app.services.query_service import QueryService, CachedQueryService
 from app.state.query_builder_state import QueryBuilderState
 from app.repositories.query_repository import QueryRepository
 
@@ -11,6 +11,7 @@ from app.repositories.query_repository import QueryRepository
 from app.ui.tab_databases import TabDatabases
 from app.ui.tab_builder import TabBuilder
 from app.ui.tab_library import TabLibrary
+from app.ui._worker import Worker
 
 
 class App(tk.Tk):
@@ -26,6 +27,8 @@ class App(tk.Tk):
         self.query_service.meta_repo = self.meta_repo
         self.query_service.query_repo = self.query_repo
         self.state = QueryBuilderState()
+        # фоновый поток для долгих операций с БД (рескан схемы и т.п.)
+        self.worker = Worker(self)
 
         # общие списки
         self.saved_queries = []  # [{title,db, sql}]
@@ -40,7 +43,7 @@ class App(tk.Tk):
             parent=self.nb,
             meta_repo=self.meta_repo,
             on_registry_changed=self._on_registry_changed,
-            on_rescan=lambda dbname: None,  # можно привязать реальный рескан
+            on_rescan=self._on_rescan,
         )
         self.nb.add(self.tab_db, text="Databases")
 
@@ -70,35 +73,64 @@ class App(tk.Tk):
         self.tab_lib = TabLibrary(
             parent=self.nb,
             get_db_choices=db_choices,
-            get_saved=lambda db_id: query_repo.list_saved(db_id),
-            get_history=lambda db_id: query_repo.list_history(db_id if db_id is not None else None),
+            get_saved=lambda db_id, limit, offset: query_repo.list_saved(db_id, limit, offset),
+            count_saved=lambda db_id: query_repo.count_saved(db_id),
+            get_history=lambda db_id, limit, offset: query_repo.list_history(db_id, limit, offset),
             delete_saved=lambda saved_id: self.query_repo.delete_saved(saved_id),
             query_service=self.query_service,
         )
         self.nb.add(self.tab_lib, text="Library / History")
+        # Library / History ходит в мета-БД только когда её впервые открыли
+        self.nb.bind("<<NotebookTabChanged>>", self._on_tab_changed)
 
         # стартовая вкладка — конструктор
         self.nb.select(self.tab_builder)
 
+        # при закрытии окна допишем отложенную историю
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+
     # --- callbacks wiring ---
 
 
+    def _on_tab_changed(self, _event=None):
+        if self.nb.select() == str(self.tab_lib):
+            self.tab_lib.ensure_loaded()
+
     def _on_registry_changed(self):
         """Когда список БД изменился (добавили/удалили) — обновим выпадашку в билдоре."""
+        self.query_service.clear_db_id_cache()
         self.tab_builder.refresh_databases()
+        self.tab_lib.invalidate_db_choices()
+
+    def _on_rescan(self, dbname: str):
+        """Рескан схемы в фоновом потоке, чтобы не замораживать UI."""
+        self.worker.submit(
+            self.meta_repo.rescan_schema, dbname,
+            on_done=lambda _res: self._on_rescanned(dbname),
+            on_error=lambda e: messagebox.showerror("Rescan error", str(e)),
+        )
 
-    def _on_run_logged(self, entry: dict):
-        # История уже записывается QueryService → просто обновим вкладку
-        self.tab_lib.refresh_lists()
+    def _on_rescanned(self, dbname: str):
+        """Рескан схемы завершён."""
+        self.tab_builder.invalidate_columns_cache()
+        messagebox.showinfo("Rescan", f"Schema for '{dbname}' updated.")
+
+    def _on_close(self):
+        try:
+            self.query_service.close()
+        finally:
+            self.destroy()
 
     def _on_saved_query(self, entry: dict):
-        # Сохранённые уже в БД → просто обновим вкладку
+        # Сохранённые уже в БД → сбросим кеш списка и обновим вкладку
+        self.tab_lib.invalidate_cache("saved")
         self.tab_lib.refresh_lists()
 
 
 if __name__ == "__main__":
     meta_repo = MetaRepository()
     query_repo = QueryRepository()
-    query_service = QueryService(meta_repo=meta_repo, query_repo=query_repo)
+    query_service = CachedQueryService(meta_repo=meta_repo, query_repo=query_repo, ttl=60,
+                                       async_history=True)
     app = App(meta_repo, query_service, query_repo)
     app.mainloop()
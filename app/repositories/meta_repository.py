@@ -1,17 +1,250 @@
 # app/repositories/meta_repository.py
 from __future__ import annotations
-from typing import Dict, List, Tuple
+import io
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Set, Tuple
 
-from sqlalchemy import text
+from sqlalchemy import Column, Integer, MetaData, Table, Text, insert, text
 from app.db.connections import get_engine, test_connection
+from app.extractors.base import ColumnInfo, PrimaryKeyInfo, TableSchema
 from app.extractors.postgres import PostgresExtractor
 
 
+# один Engine (и пул) мета-БД на процесс; репозитории только берут ссылку
+_META_ENGINE = get_engine("metadata")
+
+# описания meta_* таблиц для Core insert() (без ORM и reflection). Именно Table с
+# primary key, а не lightweight table(): insertmanyvalues с sort_by_parameter_order
+# опирается на sentinel-колонку (id), которой у TableClause нет
+_meta = MetaData()
+_meta_tables = Table(
+    "meta_tables", _meta,
+    Column("id", Integer, primary_key=True), Column("database_id", Integer), Column("name", Text),
+)
+_meta_columns = Table(
+    "meta_columns", _meta,
+    Column("id", Integer, primary_key=True), Column("table_id", Integer),
+    Column("name", Text), Column("data_type", Text),
+)
+_meta_primary_keys = Table(
+    "meta_primary_keys", _meta,
+    Column("id", Integer, primary_key=True), Column("table_id", Integer),
+)
+_meta_primary_key_columns = Table(
+    "meta_primary_key_columns", _meta,
+    Column("pk_id", Integer), Column("column_id", Integer), Column("ordinal_position", Integer),
+)
+_meta_foreign_keys = Table(
+    "meta_foreign_keys", _meta,
+    Column("id", Integer, primary_key=True), Column("table_id", Integer),
+    Column("referenced_table_id", Integer),
+)
+_meta_foreign_key_columns = Table(
+    "meta_foreign_key_columns", _meta,
+    Column("fk_id", Integer), Column("column_id", Integer),
+    Column("referenced_column_id", Integer), Column("ordinal_position", Integer),
+)
+
+# SQL собран один раз при импорте: text() не парсится заново на каждый вызов,
+# а скомпилированная форма переиспользуется из compiled_cache движка.
+_SQL_GET_DB_ID = text("SELECT id FROM meta_databases WHERE name = :n")
+_SQL_UPSERT_DB = text("""
+    INSERT INTO meta_databases (name)
+    VALUES (:n)
+    ON CONFLICT (name) DO NOTHING
+    RETURNING id
+""")
+# рескан легко повторить, поэтому коммиту не нужно ждать сброса WAL на диск;
+# DEFERRED действует только на ограничения, объявленные DEFERRABLE в DDL
+_SQL_RESCAN_TX_SETUP = (
+    text("SET LOCAL synchronous_commit = off"),
+    text("SET CONSTRAINTS ALL DEFERRED"),
+)
+# текущее состояние БД в мета-схеме (для диффа при рескане)
+_SQL_EXISTING_TABLES = text("SELECT id, name FROM meta_tables WHERE database_id = :db")
+_SQL_EXISTING_COLUMNS = text("""
+    SELECT c.id, t.name, c.name, c.data_type
+    FROM meta_columns c
+    JOIN meta_tables t ON t.id = c.table_id
+    WHERE t.database_id = :db
+""")
+_SQL_EXISTING_PK_COLUMNS = text("""
+    SELECT pk.id, t.name, c.name
+    FROM meta_primary_keys pk
+    JOIN meta_tables t ON t.id = pk.table_id
+    JOIN meta_primary_key_columns pkc ON pkc.pk_id = pk.id
+    JOIN meta_columns c ON c.id = pkc.column_id
+    WHERE t.database_id = :db
+    ORDER BY pk.id, pkc.ordinal_position
+""")
+_SQL_EXISTING_FK_COLUMNS = text("""
+    SELECT fk.id, t.name, rt.name, c.name, rc.name
+    FROM meta_foreign_keys fk
+    JOIN meta_tables t ON t.id = fk.table_id
+    JOIN meta_tables rt ON rt.id = fk.referenced_table_id
+    JOIN meta_foreign_key_columns fkc ON fkc.fk_id = fk.id
+    JOIN meta_columns c ON c.id = fkc.column_id
+    JOIN meta_columns rc ON rc.id = fkc.referenced_column_id
+    WHERE t.database_id = :db
+    ORDER BY fk.id, fkc.ordinal_position
+""")
+# строки колонок ключей удаляем явно, не полагаясь на каскад от meta_*_keys
+_SQL_DELETE_KEYS = (
+    text("""
+        DELETE FROM meta_primary_key_columns
+        WHERE pk_id IN (
+            SELECT pk.id FROM meta_primary_keys pk
+            JOIN meta_tables t ON t.id = pk.table_id
+            WHERE t.database_id = :db
+        )
+    """),
+    text("""
+        DELETE FROM meta_primary_keys
+        WHERE table_id IN (SELECT id FROM meta_tables WHERE database_id = :db)
+    """),
+    text("""
+        DELETE FROM meta_foreign_key_columns
+        WHERE fk_id IN (
+            SELECT fk.id FROM meta_foreign_keys fk
+            JOIN meta_tables t ON t.id = fk.table_id
+            WHERE t.database_id = :db
+        )
+    """),
+    text("""
+        DELETE FROM meta_foreign_keys
+        WHERE table_id IN (SELECT id FROM meta_tables WHERE database_id = :db)
+    """),
+)
+_SQL_DELETE_TABLES_BY_ID = text("DELETE FROM meta_tables WHERE id = ANY(:ids)")
+_SQL_DELETE_COLUMNS_BY_ID = text("DELETE FROM meta_columns WHERE id = ANY(:ids)")
+_SQL_UPDATE_COLUMN_TYPE = text("UPDATE meta_columns SET data_type = :data_type WHERE id = :id")
+_SQL_LIST_DBS = text("SELECT name FROM meta_databases ORDER BY name")
+_SQL_LIST_DBS_WITH_IDS = text("SELECT id, name FROM meta_databases ORDER BY name")
+_SQL_LIST_TABLES = text("""
+    SELECT name
+    FROM meta_tables
+    WHERE database_id = :db
+    ORDER BY name
+""")
+_SQL_TABLE_ID = text("""
+    SELECT id
+    FROM meta_tables
+    WHERE database_id = :db AND name = :t
+""")
+_SQL_LIST_COLUMNS = text("""
+    SELECT name, data_type
+    FROM meta_columns
+    WHERE table_id = :t
+    ORDER BY name
+""")
+
+
+# сколько секунд считаем успешную проверку соединения действительной для add_database
+_VERIFY_TTL = 60.0
+
+
 def _fq(schema: str, table: str) -> str:
     """Собрать полное имя 'schema.table' для хранения в meta_tables.name."""
     return f"{schema}.{table}"
 
 
+@dataclass(slots=True)
+class _ScannedSchema:
+    """Результат extract_schema() в том же виде, что и сигнатуры из мета-БД."""
+    fqs: List[str]                                   # 'schema.table' в порядке скана
+    tables: List[TableSchema]                        # те же таблицы, параллельно fqs
+    new_fq_set: Set[str]
+    pk_defs: List[Tuple[str, PrimaryKeyInfo]]        # (fq, PK) — для вставки
+    new_pk_sigs: List[tuple]                         # (fq, (col, ...))
+    new_fk_sigs: List[Tuple[str, str, Tuple[Tuple[str, str], ...]]]  # (fq, ref_fq, ((col, ref_col), ...))
+
+
+@dataclass(slots=True)
+class _SchemaDiff:
+    """Что нужно изменить в meta_* одной БД, чтобы она совпала со сканом."""
+    dropped_table_ids: List[int]
+    dropped_column_ids: List[int]
+    type_updates: List[dict]                         # [{"id": column_id, "data_type": ...}]
+    added_fqs: List[str]
+    added_columns: List[Tuple[str, ColumnInfo]]      # (fq, колонка) в порядке скана
+    keys_changed: bool
+
+    def is_empty(self) -> bool:
+        return not (self.dropped_table_ids or self.dropped_column_ids or self.type_updates
+                    or self.added_fqs or self.added_columns or self.keys_changed)
+
+
+def _scan_signatures(extracted: Dict[Tuple[str, str], TableSchema]) -> _ScannedSchema:
+    """Привести результат PostgresExtractor.extract_schema() к сигнатурам для диффа."""
+    scanned = list(extracted.values())
+    fqs = [_fq(schema, tname) for schema, tname in extracted]
+    new_fq_set = set(fqs)
+    pk_defs: List[Tuple[str, PrimaryKeyInfo]] = []
+    new_pk_sigs: List[tuple] = []
+    # (fq, ref_fq, ((col, ref_col), ...)) — заодно и определения FK для вставки
+    new_fk_sigs: List[Tuple[str, str, Tuple[Tuple[str, str], ...]]] = []
+    for fq, ts in zip(fqs, scanned):
+        # В большинстве СУБД PK один, но интерфейс позволяет несколько → проставим все.
+        for pk in ts.primary_keys:
+            pk_defs.append((fq, pk))
+            # В BaseExtractor есть columns + ordinal_positions одинаковой длины
+            cols = sorted(zip(pk.ordinal_positions, pk.columns))
+            new_pk_sigs.append((fq, tuple(name for _pos, name in cols)))
+        for fk in ts.foreign_keys:
+            tgt_fq = _fq(fk.referenced_schema, fk.referenced_table)
+            # Убедимся, что цель есть среди таблиц (должна быть, так как мы прошли по всем)
+            if tgt_fq not in new_fq_set:
+                # На всякий случай можно создать запись (но логичнее считать это ошибкой входных метаданных)
+                raise RuntimeError(f"Referenced table '{tgt_fq}' not found in scan result")
+            # Пары колонок и их порядок.
+            # Если extractor дал 'column_pairs' — используем его (сохраняет соответствие и порядок),
+            # иначе сопоставим по позиции.
+            pairs = fk.column_pairs or zip(fk.columns, fk.referenced_columns)
+            new_fk_sigs.append((fq, tgt_fq, tuple((src, tgt) for src, tgt in pairs)))
+
+    return _ScannedSchema(fqs, scanned, new_fq_set, pk_defs, new_pk_sigs, new_fk_sigs)
+
+
+def _diff_schema(
+    scan: _ScannedSchema,
+    old_table_ids: Dict[str, int],
+    old_columns: Dict[str, Dict[str, Tuple[int, str]]],
+    old_pk_sigs: List[tuple],
+    old_fk_sigs: List[tuple],
+) -> _SchemaDiff:
+    """
+    Дифф скана с состоянием мета-БД: old_table_ids — fq -> id,
+    old_columns — fq -> {имя колонки: (id, data_type)}, *_sigs — как в _key_signatures.
+    Чистая функция: в БД не ходит.
+    """
+    new_fq_set = scan.new_fq_set
+    dropped_table_ids = [tid for fq, tid in old_table_ids.items() if fq not in new_fq_set]
+    dropped_column_ids: List[int] = []
+    type_updates: List[dict] = []
+    for fq, ts in zip(scan.fqs, scan.tables):
+        old = old_columns.get(fq)
+        if not old:
+            continue
+        new_types = {c.name: c.data_type for c in ts.columns}
+        for name, (cid, data_type) in old.items():
+            if name not in new_types:
+                dropped_column_ids.append(cid)
+            elif new_types[name] != data_type:
+                type_updates.append({"id": cid, "data_type": new_types[name]})
+    added_fqs = [fq for fq in scan.fqs if fq not in old_table_ids]
+    added_columns = [
+        (fq, c) for fq, ts in zip(scan.fqs, scan.tables)
+        for c in ts.columns if c.name not in old_columns.get(fq, {})
+    ]
+    keys_changed = (
+        sorted(old_pk_sigs) != sorted(scan.new_pk_sigs)
+        or sorted(old_fk_sigs) != sorted(scan.new_fk_sigs)
+    )
+    return _SchemaDiff(dropped_table_ids, dropped_column_ids, type_updates,
+                       added_fqs, added_columns, keys_changed)
+
+
 class MetaRepository:
     """
     Репозиторий для работы с мета-БД.
@@ -20,14 +253,16 @@ class MetaRepository:
 
     def __init__(self):
         # Подключение к мета-БД (где лежат meta_* таблицы).
-        self.engine = get_engine("metadata")
+        self.engine = _META_ENGINE
+        # имя БД -> время последней успешной проверки соединения
+        self._verified_at: Dict[str, float] = {}
 
     # ---------- служебные пом helpers ----------
 
     def _get_database_id(self, conn, name: str) -> int:
         """Получить id записи в meta_databases по имени (или кинуть ошибку)."""
         row = conn.execute(
-            text("SELECT id FROM meta_databases WHERE name = :n"),
+            _SQL_GET_DB_ID,
             {"n": name},
         ).fetchone()
         if not row:
@@ -40,12 +275,7 @@ class MetaRepository:
         UNIQUE(name) уже есть → используем ON CONFLICT DO NOTHING + RETURNING id.
         """
         row = conn.execute(
-            text("""
-                INSERT INTO meta_databases (name)
-                VALUES (:n)
-                ON CONFLICT (name) DO NOTHING
-                RETURNING id
-            """),
+            _SQL_UPSERT_DB,
             {"n": name},
         ).fetchone()
         if row:
@@ -55,189 +285,207 @@ class MetaRepository:
 
     # ---------- регистрация БД ----------
 
-    def add_database(self, name: str) -> int:
+    def add_database(self, name: str, verify: bool = True) -> int:
         """
-        Добавить БД в реестр (с предварительным тестом соединения) и вернуть её id.
+        Добавить БД в реестр и вернуть её id.
+        При verify=True сначала проверяется соединение; успешная проверка
+        запоминается на _VERIFY_TTL секунд, повторные вызовы её пропускают.
         """
         if not name:
             raise ValueError("Database name is empty")
-        if not test_connection(name):
-            raise ValueError(f"Can't connect to database '{name}'")
+        if verify:
+            self._verify_connection(name)
 
         with self.engine.begin() as conn:
             db_id = self._upsert_database(conn, name)
         return db_id
 
+    def _verify_connection(self, name: str) -> None:
+        checked = self._verified_at.get(name)
+        if checked is not None and time.monotonic() - checked < _VERIFY_TTL:
+            return
+        if not test_connection(name):
+            self._verified_at.pop(name, None)
+            raise ValueError(f"Can't connect to database '{name}'")
+        self._verified_at[name] = time.monotonic()
+
     # ---------- пересканирование схемы ----------
 
     def rescan_schema(self, dbname: str) -> None:
         """
         Считает метаданные из реальной БД `dbname` (через PostgresExtractor) и
-        полностью пересобирает записи в meta_* для этой БД.
+        приводит записи в meta_* для этой БД к актуальному состоянию.
 
-        Стратегия:
+        Стратегия (дифф вместо полной перезаписи):
           1) получаем/гарантируем meta_databases.id для dbname;
-          2) удаляем meta_tables по database_id (CASCADE очистит дочерние таблицы);
-          3) создаём записи:
-             - meta_tables (name = 'schema.table')
-             - meta_columns
-             - meta_primary_keys + meta_primary_key_columns
-             - meta_foreign_keys + meta_foreign_key_columns
+          2) читаем то, что уже лежит в meta_* (таблицы, колонки, сигнатуры ключей);
+          3) если ничего не изменилось — выходим без записи;
+          4) иначе удаляем пропавшие таблицы/колонки, обновляем data_type,
+             добавляем новые таблицы/колонки (id неизменных строк сохраняются);
+          5) ключи (PK/FK) пересобираем целиком, только если их набор изменился.
         """
         # 1) читаем метаданные источника
         ext = PostgresExtractor({"dbname": dbname})
         with ext:
-            tables = ext.list_tables()
-            # Предзагрузим всё, чтобы один раз обращаться к источнику:
-            per_table_columns: Dict[str, List[dict]] = {}
-            per_table_pks: Dict[str, List[dict]] = {}
-            per_table_fks: Dict[str, List[dict]] = {}
-            for t in tables:
-                fq = _fq(t["schema"], t["table_name"])
-                per_table_columns[fq] = ext.list_columns(t["schema"], t["table_name"])
-                per_table_pks[fq] = ext.list_primary_keys(t["schema"], t["table_name"])
-                per_table_fks[fq] = ext.list_foreign_keys(t["schema"], t["table_name"])
+            # вся схема за несколько пакетных запросов вместо 1 + 3N
+            extracted = ext.extract_schema()
+
+        scan = _scan_signatures(extracted)
 
         # 2) пишем в мета-БД
         with self.engine.begin() as conn:
+            for stmt in _SQL_RESCAN_TX_SETUP:
+                conn.execute(stmt)
+
             # гарантируем запись в meta_databases
             database_id = self._upsert_database(conn, dbname)
-
-            # удаляем существующие таблицы этой БД (каскады очистят колонки/ключи)
-            conn.execute(
-                text("DELETE FROM meta_tables WHERE database_id = :db_id"),
-                {"db_id": database_id},
+            params = {"db": database_id}
+
+            old_table_ids: Dict[str, int] = {
+                name: int(tid) for tid, name in conn.execute(_SQL_EXISTING_TABLES, params)
+            }
+            # fq -> {имя колонки: (id, data_type)}
+            old_columns: Dict[str, Dict[str, Tuple[int, str]]] = {}
+            for cid, fq, name, data_type in conn.execute(_SQL_EXISTING_COLUMNS, params):
+                old_columns.setdefault(fq, {})[name] = (int(cid), data_type)
+            old_pk_sigs = self._key_signatures(conn, _SQL_EXISTING_PK_COLUMNS, params, prefix_len=1)
+            old_fk_sigs = self._key_signatures(conn, _SQL_EXISTING_FK_COLUMNS, params, prefix_len=2)
+
+            # 3) дифф таблиц, колонок и сигнатур ключей
+            diff = _diff_schema(scan, old_table_ids, old_columns, old_pk_sigs, old_fk_sigs)
+            if diff.is_empty():
+                return
+
+            # 4) ключи зависят от id колонок — снимаем их до удаления колонок
+            if diff.keys_changed:
+                for stmt in _SQL_DELETE_KEYS:
+                    conn.execute(stmt, params)
+            if diff.dropped_table_ids:
+                # каскады очистят колонки/ключи удалённых таблиц
+                conn.execute(_SQL_DELETE_TABLES_BY_ID, {"ids": diff.dropped_table_ids})
+            if diff.dropped_column_ids:
+                conn.execute(_SQL_DELETE_COLUMNS_BY_ID, {"ids": diff.dropped_column_ids})
+            if diff.type_updates:
+                conn.execute(_SQL_UPDATE_COLUMN_TYPE, diff.type_updates)
+
+            # Все вставки — executemany через insert().returning(sort_by_parameter_order=True):
+            # SQLAlchemy склеивает их в multi-row VALUES (insertmanyvalues) и
+            # возвращает id строго в порядке параметров.
+
+            # 4.1) новые таблицы
+            table_id_by_fq: Dict[str, int] = {
+                fq: tid for fq, tid in old_table_ids.items() if fq in scan.new_fq_set
+            }
+            ids = self._insert_returning_ids(
+                conn, _meta_tables,
+                [{"database_id": database_id, "name": fq} for fq in diff.added_fqs],
             )
-
-            # маппинги для id
-            table_id_by_fq: Dict[str, int] = {}
-            column_id_by_fq_and_name: Dict[Tuple[str, str], int] = {}
-
-            # 2.1) таблицы
-            for t in tables:
-                fq = _fq(t["schema"], t["table_name"])
-                row = conn.execute(
-                    text("""
-                        INSERT INTO meta_tables (database_id, name)
-                        VALUES (:db_id, :name)
-                        RETURNING id
-                    """),
-                    {"db_id": database_id, "name": fq},
-                ).fetchone()
-                table_id = int(row[0])
-                table_id_by_fq[fq] = table_id
-
-            # 2.2) колонки
-            for fq, cols in per_table_columns.items():
-                table_id = table_id_by_fq[fq]
-                for c in cols:
-                    row = conn.execute(
-                        text("""
-                            INSERT INTO meta_columns (table_id, name, data_type)
-                            VALUES (:t_id, :c_name, :c_dtype)
-                            RETURNING id
-                        """),
-                        {"t_id": table_id, "c_name": c["name"], "c_dtype": c["data_type"]},
-                    ).fetchone()
-                    col_id = int(row[0])
-                    column_id_by_fq_and_name[(fq, c["name"])] = col_id
-
-            # 2.3) первичные ключи (+ порядок колонок)
-            for fq, pk_defs in per_table_pks.items():
-                if not pk_defs:
-                    continue
-                table_id = table_id_by_fq[fq]
-
-                # В большинстве СУБД PK один, но интерфейс позволяет несколько → проставим все.
-                for pk in pk_defs:
-                    row = conn.execute(
-                        text("""
-                            INSERT INTO meta_primary_keys (table_id)
-                            VALUES (:t_id)
-                            RETURNING id
-                        """),
-                        {"t_id": table_id},
-                    ).fetchone()
-                    pk_id = int(row[0])
-
-                    # Колонки PK по порядку
-                    # В BaseExtractor есть columns + ordinal_positions одинаковой длины
-                    cols: List[str] = pk["columns"]
-                    ords: List[int] = pk["ordinal_positions"]
-                    for col_name, ord_pos in zip(cols, ords):
-                        col_id = column_id_by_fq_and_name[(fq, col_name)]
-                        conn.execute(
-                            text("""
-                                INSERT INTO meta_primary_key_columns
-                                    (pk_id, column_id, ordinal_position)
-                                VALUES (:pk_id, :col_id, :ord)
-                            """),
-                            {"pk_id": pk_id, "col_id": col_id, "ord": int(ord_pos)},
-                        )
-
-            # 2.4) внешние ключи (+ порядок и пары колонок)
-            for src_fq, fk_list in per_table_fks.items():
-                if not fk_list:
-                    continue
-                src_table_id = table_id_by_fq[src_fq]
-
-                for fk in fk_list:
-                    tgt_fq = _fq(fk["referenced_schema"], fk["referenced_table"])
-                    # Убедимся, что цель есть среди таблиц (должна быть, так как мы прошли по всем)
-                    if tgt_fq not in table_id_by_fq:
-                        # На всякий случай можно создать запись (но логичнее считать это ошибкой входных метаданных)
-                        raise RuntimeError(f"Referenced table '{tgt_fq}' not found in scan result")
-                    tgt_table_id = table_id_by_fq[tgt_fq]
-
-                    row = conn.execute(
-                        text("""
-                            INSERT INTO meta_foreign_keys (table_id, referenced_table_id)
-                            VALUES (:src_id, :tgt_id)
-                            RETURNING id
-                        """),
-                        {"src_id": src_table_id, "tgt_id": tgt_table_id},
-                    ).fetchone()
-                    fk_id = int(row[0])
-
-                    # Пары колонок и их порядок.
-                    # Если extractor дал 'column_pairs' — используем его (сохраняет соответствие и порядок),
-                    # иначе сопоставим по позиции.
-                    pairs = fk.get("column_pairs") or list(
-                        zip(fk["columns"], fk["referenced_columns"])
-                    )
-                    for idx, (src_col, tgt_col) in enumerate(pairs, start=1):
-                        src_col_id = column_id_by_fq_and_name[(src_fq, src_col)]
-                        tgt_col_id = column_id_by_fq_and_name[(tgt_fq, tgt_col)]
-                        conn.execute(
-                            text("""
-                                INSERT INTO meta_foreign_key_columns
-                                    (fk_id, column_id, referenced_column_id, ordinal_position)
-                                VALUES (:fk_id, :c_id, :rc_id, :ord)
-                            """),
-                            {
-                                "fk_id": fk_id,
-                                "c_id": src_col_id,
-                                "rc_id": tgt_col_id,
-                                "ord": idx,
-                            },
-                        )
+            table_id_by_fq.update(zip(diff.added_fqs, ids))
+
+            # 4.2) новые колонки; id пришли в порядке diff.added_columns
+            ids = self._insert_returning_ids(
+                conn, _meta_columns,
+                [
+                    {"table_id": table_id_by_fq[fq], "name": c.name, "data_type": c.data_type}
+                    for fq, c in diff.added_columns
+                ],
+            )
+            if not diff.keys_changed:
+                return
+
+            # fq -> {имя колонки: id}; без составных ключей-кортежей
+            column_ids_by_fq: Dict[str, Dict[str, int]] = {
+                fq: {name: cid for name, (cid, _t) in old_columns.get(fq, {}).items()}
+                for fq in scan.fqs
+            }
+            for (fq, c), cid in zip(diff.added_columns, ids):
+                column_ids_by_fq[fq][c.name] = cid
+
+            # 5.1) первичные ключи (+ порядок колонок)
+            pk_ids = self._insert_returning_ids(
+                conn, _meta_primary_keys,
+                [{"table_id": table_id_by_fq[fq]} for fq, _pk in scan.pk_defs],
+            )
+            # строки без RETURNING льём через COPY: (pk_id, column_id, ordinal_position)
+            pk_col_rows: List[tuple] = []
+            for pk_id, (fq, pk) in zip(pk_ids, scan.pk_defs):
+                col_ids = column_ids_by_fq[fq]
+                for col_name, ord_pos in zip(pk.columns, pk.ordinal_positions):
+                    pk_col_rows.append((pk_id, col_ids[col_name], int(ord_pos)))
+            self._bulk_load(conn, _meta_primary_key_columns, pk_col_rows)
+
+            # 5.2) внешние ключи (+ порядок и пары колонок)
+            fk_ids = self._insert_returning_ids(
+                conn, _meta_foreign_keys,
+                [
+                    {"table_id": table_id_by_fq[src_fq], "referenced_table_id": table_id_by_fq[tgt_fq]}
+                    for src_fq, tgt_fq, _pairs in scan.new_fk_sigs
+                ],
+            )
+            # (fk_id, column_id, referenced_column_id, ordinal_position)
+            fk_col_rows: List[tuple] = []
+            for fk_id, (src_fq, tgt_fq, pairs) in zip(fk_ids, scan.new_fk_sigs):
+                src_ids, tgt_ids = column_ids_by_fq[src_fq], column_ids_by_fq[tgt_fq]
+                for idx, (src_col, tgt_col) in enumerate(pairs, start=1):
+                    fk_col_rows.append((fk_id, src_ids[src_col], tgt_ids[tgt_col], idx))
+            self._bulk_load(conn, _meta_foreign_key_columns, fk_col_rows)
+
+    @staticmethod
+    def _key_signatures(conn, stmt, params: dict, prefix_len: int) -> List[tuple]:
+        """
+        Сигнатуры ключей из мета-БД в том же виде, что строит rescan_schema:
+        PK -> (fq, (col, ...)), FK -> (fq, ref_fq, ((col, ref_col), ...)).
+        stmt возвращает (key_id, <prefix_len полей>, <колонка или пара>)
+        в порядке ordinal_position.
+        """
+        grouped: Dict[int, Tuple[tuple, list]] = {}
+        for key_id, *rest in conn.execute(stmt, params):
+            prefix, cols = tuple(rest[:prefix_len]), rest[prefix_len:]
+            entry = grouped.setdefault(key_id, (prefix, []))
+            entry[1].append(cols[0] if len(cols) == 1 else tuple(cols))
+        return [prefix + (tuple(cols),) for prefix, cols in grouped.values()]
+
+    @staticmethod
+    def _bulk_load(conn, tbl, rows: List[tuple]) -> None:
+        """
+        Залить строки (в порядке колонок tbl) через COPY ... FROM STDIN в той же
+        транзакции. Если драйвер не psycopg2 (нет copy_expert) — обычный executemany.
+        Значения здесь — целые id/позиции, поэтому текстовый формат COPY без экранирования.
+        """
+        if not rows:
+            return
+        names = [c.name for c in tbl.c]
+        dbapi = conn.connection.dbapi_connection
+        with dbapi.cursor() as cur:
+            if hasattr(cur, "copy_expert"):
+                buf = io.StringIO()
+                for row in rows:
+                    buf.write("\t".join("\\N" if v is None else str(v) for v in row))
+                    buf.write("\n")
+                buf.seek(0)
+                cur.copy_expert(f"COPY {tbl.name} ({', '.join(names)}) FROM STDIN", buf)
+                return
+        conn.execute(insert(tbl), [dict(zip(names, row)) for row in rows])
+
+    @staticmethod
+    def _insert_returning_ids(conn, tbl, params: List[dict]) -> List[int]:
+        """executemany INSERT ... RETURNING id; id возвращаются в порядке params."""
+        if not params:
+            return []
+        stmt = insert(tbl).returning(tbl.c.id, sort_by_parameter_order=True)
+        return [int(i) for i in conn.execute(stmt, params).scalars()]
 
     # ---------- чтение для UI ----------
 
     def list_databases(self) -> List[str]:
         """Список БД из мета-реестра по имени."""
         with self.engine.connect() as conn:
-            rows = conn.execute(
-                text("SELECT name FROM meta_databases ORDER BY name")
-            ).fetchall()
-        return [r[0] for r in rows]
+            return list(conn.execute(_SQL_LIST_DBS).scalars())
 
     def list_databases_with_ids(self) -> List[Tuple[int, str]]:
         """[(id, name)] всех БД из мета-реестра, отсортированных по имени."""
         with self.engine.connect() as conn:
-            rows = conn.execute(
-                text("SELECT id, name FROM meta_databases ORDER BY name")
-            ).fetchall()
+            rows = conn.execute(_SQL_LIST_DBS_WITH_IDS).fetchall()
         return [(int(r[0]), r[1]) for r in rows]
 
     def list_tables(self, dbname: str) -> List[str]:
@@ -246,16 +494,7 @@ class MetaRepository:
         """
         with self.engine.connect() as conn:
             db_id = self._get_database_id(conn, dbname)
-            rows = conn.execute(
-                text("""
-                    SELECT name
-                    FROM meta_tables
-                    WHERE database_id = :db
-                    ORDER BY name
-                """),
-                {"db": db_id},
-            ).fetchall()
-        return [r[0] for r in rows]
+            return list(conn.execute(_SQL_LIST_TABLES, {"db": db_id}).scalars())
 
     def list_columns(self, dbname: str, table: str) -> List[Tuple[str, str]]:
         """
@@ -268,29 +507,14 @@ class MetaRepository:
 
         with self.engine.connect() as conn:
             db_id = self._get_database_id(conn, dbname)
-            row = conn.execute(
-                text("""
-                    SELECT id
-                    FROM meta_tables
-                    WHERE database_id = :db AND name = :t
-                """),
-                {"db": db_id, "t": table},
-            ).fetchone()
+            row = conn.execute(_SQL_TABLE_ID, {"db": db_id, "t": table}).fetchone()
             if not row:
                 return []
 
             table_id = int(row[0])
-            rows = conn.execute(
-                text("""
-                    SELECT name, data_type
-                    FROM meta_columns
-                    WHERE table_id = :t
-                    ORDER BY name
-                """),
-                {"t": table_id},
-            ).fetchall()
-
-        return [(r[0], r[1]) for r in rows]
+            rows = conn.execute(_SQL_LIST_COLUMNS, {"t": table_id}).tuples().all()
+
+        return list(rows)
 
     def get_database_id(self, name: str) -> int:
         """Публичный резолвер id по имени БД (обёртка над приватным)."""
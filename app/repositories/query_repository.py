@@ -1,48 +1,118 @@
 # app/repositories/query_repository.py
-from typing import List, Dict, Any, Optional
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Sequence
+from psycopg2.extras import execute_values
 from sqlalchemy import text
 from app.db.connections import get_engine
 
+# один Engine (и пул) мета-БД на процесс; репозитории только берут ссылку
+_META_ENGINE = get_engine("metadata")
+
+# statement-объекты собраны при импорте; для запросов с опциональным
+# фильтром по БД заранее заведены оба варианта
+_SQL_SAVE_QUERY = text("""
+    INSERT INTO app.saved_queries (database_id, title, sql_text)
+    VALUES (:db, :t, :s)
+    RETURNING id
+""")
+_SQL_ADD_HISTORY = text("""
+    INSERT INTO app.run_history (database_id, sql_text, ok, duration_ms, error_text)
+    VALUES (:db_id, :sql_text, :ok, :duration_ms, :error_text)
+    RETURNING id
+""")
+_SQL_DELETE_SAVED = text("DELETE FROM app.saved_queries WHERE id = :id")
+
+_LIST_SAVED_TMPL = """
+    SELECT q.id, q.title, q.sql_text, q.created_at,
+           d.name AS db_name, q.database_id
+    FROM app.saved_queries q
+    JOIN meta_databases d ON d.id = q.database_id
+    {where}
+    ORDER BY q.created_at DESC, q.id DESC
+    LIMIT :lim OFFSET :off
+"""
+_SQL_LIST_SAVED_ALL = text(_LIST_SAVED_TMPL.format(where=""))
+_SQL_LIST_SAVED_BY_DB = text(_LIST_SAVED_TMPL.format(where="WHERE q.database_id = :db"))
+_SQL_COUNT_SAVED_ALL = text("SELECT count(*) FROM app.saved_queries")
+_SQL_COUNT_SAVED_BY_DB = text("SELECT count(*) FROM app.saved_queries WHERE database_id = :db")
+
+_LIST_HISTORY_TMPL = """
+    SELECT h.id, h.sql_text, h.ok, h.duration_ms, h.error_text, h.created_at,
+           d.name AS db_name, h.database_id
+    FROM app.run_history h
+    JOIN meta_databases d ON d.id = h.database_id
+    {where}
+    ORDER BY h.created_at DESC
+    LIMIT :lim OFFSET :off
+"""
+_SQL_LIST_HISTORY_ALL = text(_LIST_HISTORY_TMPL.format(where=""))
+_SQL_LIST_HISTORY_BY_DB = text(_LIST_HISTORY_TMPL.format(where="WHERE h.database_id = :db"))
+
+
+# строки списков — dataclass(slots=True): без per-row dict, поля в порядке SELECT'а выше
+
+@dataclass(slots=True)
+class SavedQuery:
+    id: int
+    title: str
+    sql_text: str
+    created_at: Any
+    db_name: Optional[str]
+    database_id: int
+
+
+@dataclass(slots=True)
+class HistoryEntry:
+    id: int
+    sql_text: str
+    ok: bool
+    duration_ms: int
+    error_text: Optional[str]
+    created_at: Any
+    db_name: Optional[str]
+    database_id: int
+
+
 class QueryRepository:
     def __init__(self):
-        self.engine = get_engine("metadata")
+        self.engine = _META_ENGINE
 
     def save_query(self, database_id: int, title: str, sql_text: str) -> int:
         with self.engine.begin() as conn:
             row = conn.execute(
-                text("""
-                    INSERT INTO app.saved_queries (database_id, title, sql_text)
-                    VALUES (:db, :t, :s)
-                    RETURNING id
-                """),
+                _SQL_SAVE_QUERY,
                 {"db": database_id, "t": title, "s": sql_text},
             ).fetchone()
         return int(row[0])
 
-    def list_saved(self, database_id: Optional[int] = None) -> List[Dict[str, Any]]:
-        """Если database_id=None — вернуть все сохранённые запросы."""
-        where = "WHERE q.database_id = :db" if database_id is not None else ""
-        params = {"db": database_id} if database_id is not None else {}
-        sql = f"""
-            SELECT q.id, q.title, q.sql_text, q.created_at,
-                   d.name AS db_name, q.database_id
-            FROM app.saved_queries q
-            JOIN meta_databases d ON d.id = q.database_id
-            {where}
-            ORDER BY q.created_at DESC
+    def list_saved(self, database_id: Optional[int] = None,
+                   limit: Optional[int] = None, offset: int = 0) -> List[SavedQuery]:
         """
+        Если database_id=None — сохранённые запросы всех БД.
+        limit/offset — страница списка (limit=None — до конца).
+        """
+        # LIMIT NULL в PostgreSQL означает «без ограничения»
+        params = {"lim": limit, "off": offset}
+        if database_id is not None:
+            sql = _SQL_LIST_SAVED_BY_DB
+            params["db"] = database_id
+        else:
+            sql = _SQL_LIST_SAVED_ALL
         with self.engine.connect() as conn:
-            rows = conn.execute(text(sql), params).mappings().all()
-        return [dict(r) for r in rows]
+            return [SavedQuery(*r) for r in conn.execute(sql, params)]
+
+    def count_saved(self, database_id: Optional[int] = None) -> int:
+        """Сколько всего сохранённых запросов (для полосы прокрутки списка)."""
+        if database_id is not None:
+            sql, params = _SQL_COUNT_SAVED_BY_DB, {"db": database_id}
+        else:
+            sql, params = _SQL_COUNT_SAVED_ALL, {}
+        with self.engine.connect() as conn:
+            return int(conn.execute(sql, params).scalar_one())
 
     def add_history(self, database_id: int, sql_text: str, ok: bool, duration_ms: int, error_text: str | None) -> int:
-        sql = text("""
-            INSERT INTO app.run_history (database_id, sql_text, ok, duration_ms, error_text)
-            VALUES (:db_id, :sql_text, :ok, :duration_ms, :error_text)
-            RETURNING id
-        """)
         with self.engine.begin() as conn:
-            rid = conn.execute(sql, {
+            rid = conn.execute(_SQL_ADD_HISTORY, {
                 "db_id": database_id,
                 "sql_text": sql_text,
                 "ok": ok,
@@ -51,23 +121,40 @@ class QueryRepository:
             }).scalar_one()
             return int(rid)
 
-    def list_history(self, database_id: Optional[int] = None, limit: int = 100) -> List[Dict[str, Any]]:
-        """Если database_id=None — вся история."""
-        where = "WHERE h.database_id = :db" if database_id is not None else ""
-        params = {"db": database_id, "lim": limit} if database_id is not None else {"lim": limit}
-        sql = f"""
-            SELECT h.id, h.sql_text, h.ok, h.duration_ms, h.error_text, h.created_at,
-                   d.name AS db_name, h.database_id
-            FROM app.run_history h
-            JOIN meta_databases d ON d.id = h.database_id
-            {where}
-            ORDER BY h.created_at DESC
-            LIMIT :lim
+    def log_runs_bulk(self, entries: Sequence[Dict[str, Any]]) -> None:
+        """
+        Пакетная запись истории: один INSERT ... VALUES (...), (...) на пачку
+        через psycopg2.extras.execute_values вместо запроса на каждую строку.
         """
+        if not entries:
+            return
+        rows = [
+            (e["database_id"], e["sql_text"], e["ok"], e["duration_ms"], e["error_text"])
+            for e in entries
+        ]
+        raw = self.engine.raw_connection()
+        try:
+            with raw.cursor() as cur:
+                execute_values(
+                    cur,
+                    "INSERT INTO app.run_history (database_id, sql_text, ok, duration_ms, error_text) VALUES %s",
+                    rows,
+                    page_size=500,
+                )
+            raw.commit()
+        finally:
+            raw.close()
+
+    def list_history(self, database_id: Optional[int] = None,
+                     limit: int = 100, offset: int = 0) -> List[HistoryEntry]:
+        """Если database_id=None — история всех БД (страница limit/offset, новые первыми)."""
+        if database_id is not None:
+            sql, params = _SQL_LIST_HISTORY_BY_DB, {"db": database_id, "lim": limit, "off": offset}
+        else:
+            sql, params = _SQL_LIST_HISTORY_ALL, {"lim": limit, "off": offset}
         with self.engine.connect() as conn:
-            rows = conn.execute(text(sql), params).mappings().all()
-        return [dict(r) for r in rows]
+            return [HistoryEntry(*r) for r in conn.execute(sql, params)]
 
     def delete_saved(self, saved_id: int) -> None:
         with self.engine.begin() as conn:
-            conn.execute(text("DELETE FROM app.saved_queries WHERE id = :id"), {"id": saved_id})
+            conn.execute(_SQL_DELETE_SAVED, {"id": saved_id})
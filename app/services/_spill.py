@@ -0,0 +1,81 @@
+import pickle
+import tempfile
+import threading
+from collections.abc import Sequence
+from typing import Any, Iterator, List, Optional, Tuple
+
+
+class SpilledRows(Sequence):
+    """
+    Строки большого результата, выгруженные во временный файл пачками.
+
+    Каждая пачка (ровно batch_size строк, кроме последней) пишется одним
+    pickle; в памяти держим только смещения пачек и одну последнюю
+    прочитанную пачку. Снаружи ведёт себя как обычный список строк:
+    len(), индексы, срезы и итерация — UI может листать результат постранично.
+    Файл удаляется ОС при close() или сборке объекта.
+    """
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self._file = tempfile.TemporaryFile(prefix="mini_sql_studio_")
+        self._offsets: List[int] = []
+        self._len = 0
+        self._cached: Tuple[int, Optional[List[tuple]]] = (-1, None)
+        self._lock = threading.Lock()
+
+    def append_batch(self, rows: List[tuple]) -> None:
+        if not rows:
+            return
+        with self._lock:
+            self._file.seek(0, 2)
+            self._offsets.append(self._file.tell())
+            pickle.dump(rows, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+            self._len += len(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+            self._cached = (-1, None)
+
+    # ---- Sequence ----
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, idx: Any):
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(self._len)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            out: List[tuple] = []
+            i = start
+            while i < stop:
+                batch_no, pos = divmod(i, self.batch_size)
+                batch = self._batch(batch_no)
+                take = batch[pos:pos + (stop - i)]
+                out.extend(take)
+                i += len(take)
+            return out
+        if idx < 0:
+            idx += self._len
+        if not 0 <= idx < self._len:
+            raise IndexError("row index out of range")
+        batch_no, pos = divmod(idx, self.batch_size)
+        return self._batch(batch_no)[pos]
+
+    def __iter__(self) -> Iterator[tuple]:
+        for batch_no in range(len(self._offsets)):
+            yield from self._batch(batch_no)
+
+    # ---- внутреннее ----
+
+    def _batch(self, batch_no: int) -> List[tuple]:
+        with self._lock:
+            cached_no, cached = self._cached
+            if cached_no == batch_no and cached is not None:
+                return cached
+            self._file.seek(self._offsets[batch_no])
+            batch = pickle.load(self._file)
+            self._cached = (batch_no, batch)
+            return batch
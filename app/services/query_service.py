@@ -1,55 +1,402 @@
+import itertools
+import logging
+import os
+import queue
+import re
+import threading
 import time
+from collections import OrderedDict
 from sqlalchemy import text
 from app.db.connections import get_engine
 from app.repositories.query_repository import QueryRepository
 from app.repositories.meta_repository import MetaRepository
+from app.services._spill import SpilledRows
+
+log = logging.getLogger(__name__)
+
+# SELECT'ы читаем server-side курсором пачками, а не всем результатом в память libpq
+_FETCH_BATCH = 10_000
+_SELECT_RE = re.compile(r"\s*select\b", re.I)
+# начиная с этого числа строк результат уходит во временный файл (SpilledRows)
+_SPILL_ROWS = int(os.getenv("QUERY_SPILL_ROWS", "50000"))
+# уникальные имена server-side курсоров в пределах процесса
+_cursor_seq = itertools.count()
+# фоновая запись истории: не больше _HISTORY_BATCH записей на INSERT
+# и не дольше _HISTORY_FLUSH_SEC ожидания от первой записи в пачке
+_HISTORY_BATCH = 100
+_HISTORY_FLUSH_SEC = 0.2
+_STOP = object()
+
+
+class _RowCollector:
+    """
+    Накопитель пачек строк (по _FETCH_BATCH). psycopg2 сам отдаёт кортежи —
+    ничего не копируем. Пока строк меньше _SPILL_ROWS — обычный список;
+    дальше всё уже прочитанное и остаток выгружаются в SpilledRows.
+    После перехода rows — другой объект: читатели берут его заново.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self._spill = None
+
+    def add(self, batch) -> None:
+        if self._spill is not None:
+            self._spill.append_batch(batch)
+            return
+        rows = self.rows
+        rows.extend(batch)
+        if len(rows) >= _SPILL_ROWS:
+            spill = SpilledRows(_FETCH_BATCH)
+            for i in range(0, len(rows), _FETCH_BATCH):
+                spill.append_batch(rows[i:i + _FETCH_BATCH])
+            self.rows = self._spill = spill
+
+
+def _collect_rows(batches):
+    """Собрать пачки строк в результат: list или SpilledRows (см. _RowCollector)."""
+    collector = _RowCollector()
+    for batch in batches:
+        collector.add(batch)
+    return collector.rows
+
+
+class _HistoryWriter:
+    """
+    Фоновый поток записи истории запусков: run() только кладёт запись в очередь,
+    а поток собирает пачку и пишет её одним INSERT'ом (QueryRepository.log_runs_bulk).
+    После записи пачки вызывается on_flushed(последняя запись) — из этого потока.
+    """
+
+    def __init__(self, query_repo: QueryRepository, on_flushed):
+        self.query_repo = query_repo
+        self.on_flushed = on_flushed
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, entry: dict) -> None:
+        self._queue.put_nowait(entry)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Дописать всё, что в очереди, и остановить поток."""
+        self._queue.put_nowait(_STOP)
+        self._thread.join(timeout)
+
+    def _loop(self) -> None:
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + _HISTORY_FLUSH_SEC
+            while len(batch) < _HISTORY_BATCH and batch[-1] is not _STOP:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=left))
+                except queue.Empty:
+                    break
+            if batch[-1] is _STOP:
+                stop = True
+                batch.pop()
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch: list) -> None:
+        try:
+            self.query_repo.log_runs_bulk(batch)
+        except Exception:
+            log.exception("failed to write %d history entries", len(batch))
+            return
+        cb = self.on_flushed
+        if callable(cb):
+            try:
+                cb(batch[-1])
+            except Exception:
+                pass
+
 
 class QueryService:
     def __init__(self, meta_repo: MetaRepository | None = None,
-                 query_repo: QueryRepository | None = None):
+                 query_repo: QueryRepository | None = None,
+                 async_history: bool = False):
         self.meta_repo = meta_repo
         self.query_repo = query_repo
         self.on_logged = None
+        # async_history=True: история пишется фоновым потоком пачками, и on_logged
+        # вызывается один раз на пачку (из этого потока, с последней записью пачки,
+        # у которой нет "id"), а не на каждый run()
+        self.async_history = async_history
+        self._history_writer: _HistoryWriter | None = None
+        self._history_lock = threading.Lock()
+        # dbname -> meta_databases.id (не ходим в мета-БД на каждый запуск)
+        self._db_id_cache: dict[str, int] = {}
 
-    def run(self, dbname: str, sql: str):
-        engine = get_engine(dbname)
+    def _database_id(self, dbname: str) -> int:
+        db_id = self._db_id_cache.get(dbname)
+        if db_id is None:
+            db_id = self._db_id_cache[dbname] = self.meta_repo.get_database_id(dbname)
+        return db_id
+
+    def clear_db_id_cache(self) -> None:
+        """Сбросить кеш id БД (после изменения реестра)."""
+        self._db_id_cache.clear()
+
+    def _writer(self) -> _HistoryWriter:
+        # поток поднимаем лениво: query_repo могут проставить уже после конструктора
+        with self._history_lock:
+            if self._history_writer is None:
+                self._history_writer = _HistoryWriter(self.query_repo, self._notify_logged)
+            return self._history_writer
+
+    def _notify_logged(self, entry: dict) -> None:
+        # уведомим UI, чтобы он обновил список истории
+        cb = getattr(self, "on_logged", None)
+        if callable(cb):
+            try:
+                cb(entry)
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        """Дописать отложенную историю (при выходе из приложения)."""
+        # колбэк UI маршалится в поток Tk, а тот сейчас ждёт join() ниже —
+        # при выходе уведомлять некого, иначе close() висел бы до таймаута
+        self.on_logged = None
+        with self._history_lock:
+            writer, self._history_writer = self._history_writer, None
+        if writer is not None:
+            writer.close()
+
+    def run(self, dbname: str, sql: str, params: dict | None = None):
+        """
+        Выполнить SQL на БД dbname. params биндятся драйвером
+        (плейсхолдеры :name), а не подставляются в текст запроса.
+        """
         t0 = time.perf_counter()
         ok, rows, cols, err = True, [], [], None
+        it = self._stream(dbname, sql, params)
         try:
-            with engine.connect() as conn:
-                res = conn.execute(text(sql))
-                if res.returns_rows:
-                    cols = list(res.keys())
-                    rows = [tuple(r) for r in res]
+            head = next(it, None)
+            if head is not None:
+                cols = head[0]
+                rows = _collect_rows(itertools.chain((head[1],), (b for _c, b in it)))
         except Exception as e:
             ok, err = False, str(e)
+        finally:
+            it.close()  # курсор и соединение освобождаем сразу, даже при ошибке
         dt = round((time.perf_counter() - t0) * 1000)
+        self._log_run(dbname, sql, ok, dt, err)
+        return {"ok": ok, "rows": rows, "columns": cols, "duration_ms": dt, "error": err}
+
+    def run_iter(self, dbname: str, sql: str, params: dict | None = None):
+        """
+        То же, что run(), но потоково: генератор пар (columns, rows), где rows —
+        весь прочитанный к этому моменту результат (list, а начиная с _SPILL_ROWS
+        строк — SpilledRows, т.е. уже другой объект). Пара отдаётся после каждой
+        пачки по _FETCH_BATCH строк, первая — сразу после execute (возможно,
+        с пустым rows). Для запросов без результата не отдаёт ничего. Запуск
+        пишется в историю по исчерпании генератора; ошибка БД тоже пишется
+        в историю и пробрасывается вызывающему.
+        """
+        t0 = time.perf_counter()
+        collector = _RowCollector()
+        try:
+            for cols, batch in self._stream(dbname, sql, params):
+                collector.add(batch)
+                yield cols, collector.rows
+        except Exception as e:
+            self._log_run(dbname, sql, False, round((time.perf_counter() - t0) * 1000), str(e))
+            raise
+        self._log_run(dbname, sql, True, round((time.perf_counter() - t0) * 1000), None)
 
+    def _stream(self, dbname: str, sql: str, params: dict | None):
+        """Выполнить SQL и отдавать (columns, batch), пока курсор не исчерпан."""
+        engine = get_engine(dbname)
+        with engine.connect() as conn:
+            # text() компилируем диалектом в pyformat (:name -> %(name)s,
+            # экранирование %), а выполняем сразу на DBAPI-курсоре
+            compiled = text(sql).compile(dialect=conn.dialect)
+            raw_params = compiled.construct_params(params or {})
+            dbapi = conn.connection.dbapi_connection
+            if _SELECT_RE.match(sql):
+                # server-side курсор (DECLARE ... CURSOR допустим только для SELECT)
+                cur = dbapi.cursor(name=f"qs_{next(_cursor_seq)}")
+            else:
+                cur = dbapi.cursor()
+            try:
+                cur.execute(compiled.string, raw_params)
+                # у named cursor'а description появляется после первого FETCH
+                first = cur.fetchmany(_FETCH_BATCH) if cur.name else None
+                if cur.description is None:
+                    return
+                cols = [d.name for d in cur.description]
+                if first is None:
+                    first = cur.fetchmany(_FETCH_BATCH)
+                yield cols, first
+                while True:
+                    batch = cur.fetchmany(_FETCH_BATCH)
+                    if not batch:
+                        break
+                    yield cols, batch
+            finally:
+                cur.close()
+
+    def _log_run(self, dbname: str, sql: str, ok: bool, dt: int, err: str | None,
+                 cached: bool = False) -> None:
+        """
+        Записать запуск в историю (сразу или через фоновый поток) и уведомить UI.
+        cached=True — результат отдан из кеша CachedQueryService: в истории это
+        запуск с dt≈0, а в записи для on_logged — флаг "cached".
+        """
         history_entry = None
         if self.meta_repo and self.query_repo:
             try:
-                db_id = self.meta_repo.get_database_id(dbname)
-                hist_id = self.query_repo.add_history(
-                    database_id=db_id, sql_text=sql, ok=ok, duration_ms=dt, error_text=err
-                )
-                history_entry = {
-                    "id": hist_id,
+                db_id = self._database_id(dbname)
+                entry = {
                     "database_id": db_id,
                     "sql_text": sql,
                     "ok": ok,
                     "duration_ms": dt,
                     "error_text": err,
                 }
+                if self.async_history:
+                    # без лишнего round-trip'а на горячем пути: запишет фоновый поток
+                    entry["cached"] = cached
+                    self._writer().put(entry)
+                else:
+                    entry["id"] = self.query_repo.add_history(**entry)
+                    entry["cached"] = cached
+                    history_entry = entry
             except Exception:
                 pass
 
-        # уведомим UI, чтобы он обновил список истории
-        cb = getattr(self, "on_logged", None)
-        if callable(cb) and history_entry is not None:
-            try:
-                cb(history_entry)
-            except Exception:
-                pass
+        if history_entry is not None:
+            self._notify_logged(history_entry)
 
-        return {"ok": ok, "rows": rows, "columns": cols, "duration_ms": dt, "error": err}
 
+# кавыченные литералы/идентификаторы сохраняем как есть, остальное нормализуем
+_SQL_TOKEN_RE = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|[^'\"]+|.", re.S)
+_WS_RE = re.compile(r"\s+")
+
+
+# SELECT'ы, которые нельзя отдавать из кеша: volatile-функции (время, случайные
+# значения, последовательности), вызовы с побочным эффектом (блокировки, NOTIFY,
+# set_config, ...), блокировки строк FOR UPDATE/SHARE и SELECT ... INTO (создаёт таблицу)
+_UNCACHEABLE_RE = re.compile(
+    r"\b(?:nextval|setval|currval|lastval|now|clock_timestamp|statement_timestamp"
+    r"|transaction_timestamp|timeofday|random|gen_random_uuid|uuid_generate_\w+"
+    r"|pg_\w*advisory\w*|pg_sleep\w*|pg_notify|set_config|txid_current\w*|pg_current_xact_id"
+    r"|pg_cancel_backend|pg_terminate_backend|dblink\w*)\s*\("
+    r"|\b(?:current_timestamp|current_time|current_date|localtime|localtimestamp)\b"
+    r"|\bfor (?:update|share|no key update|key share)\b"
+    r"|\binto\b"
+)
+
+
+def _normalize_sql(sql: str) -> str:
+    """
+    Ключ кеша для SQL: схлопываем пробелы и приводим к нижнему регистру
+    всё, кроме содержимого кавычек ('...' и "..."), чтобы не путать литералы.
+    """
+    parts = []
+    for m in _SQL_TOKEN_RE.finditer(sql):
+        tok = m.group()
+        if tok[0] in "'\"" and len(tok) > 1:
+            parts.append(tok)
+        else:
+            parts.append(_WS_RE.sub(" ", tok.lower()))
+    return "".join(parts).strip()
+
+
+class CachedQueryService(QueryService):
+    """
+    QueryService с LRU+TTL кешем результатов SELECT по (dbname, нормализованный SQL, параметры).
+    Повторный запуск того же запроса из Library/History отдаётся из памяти; в историю
+    такое попадание пишется как запуск за 0 мс (cached=True). SELECT'ы с volatile-
+    или побочными вызовами (_UNCACHEABLE_RE) всегда выполняются. Любой не-SELECT
+    сбрасывает кеш этой БД.
+    """
+
+    def __init__(self, meta_repo: MetaRepository | None = None,
+                 query_repo: QueryRepository | None = None,
+                 ttl: float = 60.0, maxsize: int = 256,
+                 async_history: bool = False):
+        super().__init__(meta_repo=meta_repo, query_repo=query_repo, async_history=async_history)
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._cache: OrderedDict = OrderedDict()  # (dbname, key, params) -> (ts, result)
+        self._lock = threading.Lock()
+
+    def run(self, dbname: str, sql: str, params: dict | None = None):
+        ck = self._cache_key(dbname, sql, params)
+        if ck is None:
+            return super().run(dbname, sql, params)
+
+        hit = self._lookup(ck)
+        if hit is not None:
+            self._log_run(dbname, sql, True, 0, None, cached=True)
+            return dict(hit, duration_ms=0, cached=True)
+
+        res = super().run(dbname, sql, params)
+        if res["ok"]:
+            self._store(ck, res)
+        return dict(res)
+
+    def run_iter(self, dbname: str, sql: str, params: dict | None = None):
+        # попадание в кеш отдаём одной парой; дочитанный до конца поток кладём в кеш
+        ck = self._cache_key(dbname, sql, params)
+        if ck is None:
+            yield from super().run_iter(dbname, sql, params)
+            return
+
+        hit = self._lookup(ck)
+        if hit is not None:
+            self._log_run(dbname, sql, True, 0, None, cached=True)
+            yield hit["columns"], hit["rows"]
+            return
+
+        t0 = time.perf_counter()
+        last = None
+        for last in super().run_iter(dbname, sql, params):
+            yield last
+        # сюда доходим, только если поток исчерпан без ошибки и не прерван вызывающим
+        if last is not None:
+            cols, rows = last
+            self._store(ck, {
+                "ok": True, "rows": rows, "columns": cols,
+                "duration_ms": round((time.perf_counter() - t0) * 1000), "error": None,
+            })
+
+    def _cache_key(self, dbname: str, sql: str, params: dict | None) -> tuple | None:
+        """Ключ кеша или None, если запрос кешировать нельзя (тогда кеш БД сбрасывается)."""
+        key = _normalize_sql(sql)
+        if not key.startswith("select") or _UNCACHEABLE_RE.search(key):
+            # возможна запись — всё закешированное по этой БД могло устареть
+            self.invalidate(dbname)
+            return None
+        return dbname, key, tuple(sorted((params or {}).items()))
+
+    def _lookup(self, ck: tuple) -> dict | None:
+        with self._lock:
+            hit = self._cache.get(ck)
+            if hit is None or time.monotonic() - hit[0] >= self.ttl:
+                return None
+            self._cache.move_to_end(ck)
+            return hit[1]
+
+    def _store(self, ck: tuple, res: dict) -> None:
+        with self._lock:
+            self._cache[ck] = (time.monotonic(), res)
+            self._cache.move_to_end(ck)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def invalidate(self, dbname: str | None = None) -> None:
+        """Сбросить кеш результатов для БД (или целиком)."""
+        with self._lock:
+            if dbname is None:
+                self._cache.clear()
+                return
+            for ck in [k for k in self._cache if k[0] == dbname]:
+                del self._cache[ck]
@@ -1,3 +1,28 @@
+import re
+from functools import lru_cache
+
+# таблица трансляции для экранирования двойных кавычек (один проход translate)
+_QUOTE_TRANS = str.maketrans({'"': '""'})
+# числовые литералы распознаём регуляркой, без исключений на каждой строке
+# (те же формы, что принимали int()/float(): +3, .5, 5., 1e5; но не inf/nan)
+_NUMERIC_RE = re.compile(r"[+-]?(?:\d+(\.\d*)?|(\.\d+))([eE][+-]?\d+)?")
+
+
+@lru_cache(maxsize=4096)
+def _quote_ident(ident: str) -> str:
+ # колонки/алиасы повторяются на каждой перестройке SQL — кешируем и их
+ return f'"{ident.translate(_QUOTE_TRANS)}"'
+
+
+@lru_cache(maxsize=1024)
+def _quote_fqn(fqn: str) -> str:
+ # FQN между перестройками SQL почти не меняется — кешируем результат
+ if "." in fqn:
+  s, t = fqn.split(".", 1)
+  return f'{_quote_ident(s)}.{_quote_ident(t)}'
+ return _quote_ident(fqn)
+
+
 class QueryBuilderState:
  def __init__(self):
   self.dbname = None
@@ -9,7 +34,7 @@ class QueryBuilderState:
  @staticmethod
  def _quote_ident(ident: str) -> str:
   # экранируем двойные кавычки внутри идентификатора
-  return '"' + ident.replace('"', '""') + '"'
+  return _quote_ident(ident)
 
  @classmethod
  def _quote_fqn(cls, fqn: str) -> str:
@@ -18,55 +43,75 @@ class QueryBuilderState:
   'branches'        -> '"branches"'
   Уже кавыченные части не предполагаем; если надо – расширить.
   """
-  if "." in fqn:
-   s, t = fqn.split(".", 1)
-   return f'{cls._quote_ident(s)}.{cls._quote_ident(t)}'
-  return cls._quote_ident(fqn)
+  return _quote_fqn(fqn)
 
- def build_sql(self) -> str:
+ def build_sql(self) -> tuple[str, dict]:
+  """
+  SQL с плейсхолдерами :p0, :p1, ... и словарь параметров для них.
+  Значения WHERE не вшиваются в текст — их биндит исполнитель.
+  """
+  return self._compose(inline=False)
+
+ def render_sql(self) -> str:
+  """Тот же запрос с литералами вместо плейсхолдеров (превью и сохранение)."""
+  return self._compose(inline=True)[0]
+
+ @staticmethod
+ def _coerce(val):
+  # грубая типизация: число -> int/float, иначе строка
+  sval = str(val or "")
+  num = sval.strip()  # int()/float() пробелы по краям допускали
+  m = _NUMERIC_RE.fullmatch(num)
+  if m is None:
+   return sval
+  if m.group(1) is None and m.group(2) is None and m.group(3) is None:
+   return int(num)
+  return float(num)
+
+ def _compose(self, inline: bool) -> tuple[str, dict]:
   if not self.dbname or not self.table:
-   return "-- select a database and a table"
+   return "-- select a database and a table", {}
 
-  # SELECT
+  # SELECT: каждую колонку собираем одним f-string, без конкатенации через +=
   cols = []
   for col, meta in self.selected_columns.items():
    if meta.get("checked"):
-    alias = meta.get("alias") or ""
-    part = self._quote_ident(col)
-    if alias:
-     part += f' AS {self._quote_ident(alias)}'
-    cols.append(part)
-  if not cols:
-   cols = ["*"]
+    alias = meta.get("alias")
+    cols.append(f'{_quote_ident(col)} AS {_quote_ident(alias)}' if alias else _quote_ident(col))
 
-  select_clause = "SELECT " + ", ".join(cols)
-  from_clause = f"FROM {self._quote_fqn(self.table)}"
+  parts = [
+   f'SELECT {", ".join(cols) if cols else "*"}',
+   f"FROM {_quote_fqn(self.table)}",
+  ]
 
   # WHERE (простой конструктор)
   conds = []
+  params = {}
   for f in self.filters:
    c, op, val = f.get("column"), f.get("op"), f.get("value")
    if not c or not op:
     continue
-   qcol = self._quote_ident(c)
+   qcol = _quote_ident(c)
    up = (op or "").upper()
    if up in ("IS NULL", "IS NOT NULL"):
     conds.append(f"{qcol} {up}")
+    continue
+   value = self._coerce(val)
+   if not inline:
+    name = f"p{len(params)}"
+    params[name] = value
+    conds.append(f"{qcol} {op} :{name}")
+   elif isinstance(value, str):
+    sval = value.replace("'", "''")
+    conds.append(f"{qcol} {op} '{sval}'")
    else:
-    # грубая типизация: число -> без кавычек, иначе строка в одинарных
-    try:
-     float(val)
-     conds.append(f"{qcol} {op} {val}")
-    except (TypeError, ValueError):
-     sval = str(val or "").replace("'", "''")
-     conds.append(f"{qcol} {op} '{sval}'")
-  where_clause = ("WHERE " + " AND ".join(conds)) if conds else ""
+    conds.append(f"{qcol} {op} {val}")
+  if conds:
+   parts.append("WHERE " + " AND ".join(conds))
 
   # LIMIT выводим только если > 0
-  parts = [select_clause, from_clause]
-  if where_clause:
-   parts.append(where_clause)
   if isinstance(self.limit, int) and self.limit > 0:
    parts.append(f"LIMIT {self.limit}")
 
-  return "\n".join(parts).strip()
+  # части уже без краевых пробелов — strip() не нужен
+  return "\n".join(parts), params
@@ -0,0 +1,268 @@
+from contextlib import contextmanager
+from tkinter import ttk
+from typing import Any, Callable, Iterable, List, Optional, Sequence
+
+# экранирование для Tcl-скрипта: спецсимволы — через обратный слеш,
+# пробельные управляющие — escape-последовательностями (\<newline> склеил бы строки)
+_TCL_TRANS = str.maketrans({
+    **{c: "\\" + c for c in '\\{}[]$";# '},
+    "\n": "\\n", "\t": "\\t", "\r": "\\r", "\v": "\\v", "\f": "\\f",
+})
+
+
+def _tcl_word(value: Any) -> str:
+    """Одно слово Tcl-скрипта с буквальным значением str(value)."""
+    s = str(value)
+    return s.translate(_TCL_TRANS) if s else "{}"
+
+
+def _tcl_list(values: Iterable[Any]) -> str:
+    """Tcl-список из значений — как одно слово скрипта (для -values)."""
+    return _tcl_word(" ".join(_tcl_word(v) for v in values))
+
+
+@contextmanager
+def suspend_layout(widget):
+    """
+    Снять pack-виджет с экрана на время массовых изменений и вернуть его
+    с теми же опциями и на то же место в порядке упаковки: Tk пересчитывает
+    раскладку один раз, а не на каждое изменение.
+    """
+    info = widget.pack_info()
+    # -in в конфигурации ставит виджет в конец порядка упаковки и перебил бы -before,
+    # поэтому мастер передаём отдельно, только когда соседа справа нет
+    master = info.pop("in")
+    slaves = master.pack_slaves()
+    pos = slaves.index(widget)
+    before = slaves[pos + 1] if pos + 1 < len(slaves) else None
+    widget.pack_forget()
+    try:
+        yield widget
+    finally:
+        if before is not None:
+            widget.pack(before=before, **info)
+        else:
+            widget.pack(in_=master, **info)
+
+
+class VirtualTree:
+    """
+    Виртуальный режим для ttk.Treeview.
+
+    Данные целиком лежат в Python-последовательности (list, SpilledRows, ...),
+    а в самом Treeview живут только строки видимой области — кольцо заранее
+    созданных iid. Прокрутка ничего не вставляет и не удаляет: у тех же iid
+    перезаписываются values. Скроллбар получает положение во всём
+    виртуальном диапазоне, колесо и стрелки обрабатываются здесь же.
+    """
+
+    WHEEL_UNITS = 3
+
+    def __init__(self, tree: ttk.Treeview, vsb: ttk.Scrollbar, stripe_tag: Optional[str] = None,
+                 on_window: Optional[Callable[[int, int], None]] = None):
+        self.tree = tree
+        self.vsb = vsb
+        # on_window(first, count) — после каждой перерисовки: владелец данных
+        # может дозагрузить строки видимого окна (постраничная загрузка)
+        self.on_window = on_window
+        # тег для нечётных строк данных (зебра); выставляется в том же скрипте, что и values
+        self.stripe_tag = stripe_tag
+        self._rows: Sequence[Any] = ()
+        self._first = 0
+        self._slots: List[str] = []
+        self._selected: Optional[int] = None
+        # высоты строки и заголовка уточняются по bbox первой строки
+        self._row_height = 20
+        self._header_height = 0
+
+        vsb.configure(command=self.yview)
+        # собственная прокрутка Treeview не используется: все строки кольца видимы
+        tree.configure(yscrollcommand="")
+        tree.bind("<Configure>", lambda e: self._render(), add="+")
+        tree.bind("<<TreeviewSelect>>", self._on_select, add="+")
+        tree.bind("<MouseWheel>", self._on_wheel)
+        tree.bind("<Button-4>", self._on_wheel)
+        tree.bind("<Button-5>", self._on_wheel)
+        tree.bind("<Up>", lambda e: self._move_selection(-1))
+        tree.bind("<Down>", lambda e: self._move_selection(1))
+        tree.bind("<Prior>", lambda e: self._move_selection(-self._page()))
+        tree.bind("<Next>", lambda e: self._move_selection(self._page()))
+
+    # ---- public ----
+
+    def set_rows(self, rows: Sequence[Any]) -> None:
+        """Подменить данные (строки — кортежи values) и показать их с начала."""
+        self._rows = rows if rows is not None else ()
+        self._first = 0
+        self._selected = None
+        self._render()
+
+    def refresh(self, rows: Optional[Sequence[Any]] = None) -> None:
+        """
+        Данные дополнились — перерисовать, не сбрасывая позицию и выделение.
+        rows — если дополненные данные пришли другим объектом (list -> SpilledRows).
+        """
+        if rows is not None:
+            self._rows = rows
+        self._render()
+
+    def selected_index(self) -> Optional[int]:
+        """Индекс выделенной строки в данных (а не в виджете) или None."""
+        return self._selected
+
+    def yview(self, *args) -> None:
+        """Команда вертикального скроллбара: moveto / scroll N units|pages."""
+        if not args:
+            return
+        if args[0] == "moveto":
+            self._first = int(float(args[1]) * len(self._rows))
+        elif args[0] == "scroll":
+            step = self._page() if args[2] == "pages" else 1
+            self._first += int(args[1]) * step
+        self._render()
+
+    # ---- внутреннее ----
+
+    def _page(self) -> int:
+        """Сколько строк помещается целиком."""
+        height = self.tree.winfo_height() - self._header_height
+        return max(1, height // self._row_height)
+
+    def _measure(self) -> None:
+        if not self._slots:
+            return
+        box = self.tree.bbox(self._slots[0])
+        if box:
+            self._header_height, self._row_height = box[1], max(1, box[3])
+
+    def _render(self) -> None:
+        tree, rows = self.tree, self._rows
+        n = len(rows)
+        page = self._page()
+        self._first = first = max(0, min(self._first, n - page))
+        # +1 — частично видимая строка снизу
+        count = min(page + 1, n - first)
+
+        # всё окно — одним Tcl-скриптом: новые/лишние слоты кольца и values для каждого,
+        # вместо отдельного вызова (и разбора опций ttk) на строку
+        w = tree._w
+        script = []
+        slots = self._slots
+        if len(slots) < count:
+            for i in range(len(slots), count):
+                slots.append(f"vt{i}")
+                script.append(f"{w} insert {{}} end -id vt{i}")
+        elif len(slots) > count:
+            # лишние слоты — одной командой delete в том же скрипте
+            script.append(f"{w} delete {_tcl_list(slots[count:])}")
+            del slots[count:]
+
+        stripe = self.stripe_tag
+        for i, (iid, values) in enumerate(zip(slots, rows[first:first + count]), first):
+            if stripe is None:
+                script.append(f"{w} item {iid} -values {_tcl_list(values)}")
+            else:
+                tags = _tcl_word(stripe) if i & 1 else "{}"
+                script.append(f"{w} item {iid} -values {_tcl_list(values)} -tags {tags}")
+        script.append(f"{w} yview moveto 0")
+        tree.tk.eval("\n".join(script))
+
+        sel = self._selected
+        want = (slots[sel - first],) if sel is not None and first <= sel < first + count else ()
+        if tree.selection() != want:
+            tree.selection_set(want)
+
+        if n:
+            self.vsb.set(first / n, min(1.0, (first + page) / n))
+        else:
+            self.vsb.set(0, 1)
+        self._measure()
+        if self.on_window is not None:
+            self.on_window(first, count)
+
+    def _on_select(self, _event=None) -> None:
+        sel = self.tree.selection()
+        # пустое выделение приходит и когда выбранная строка ушла за край окна —
+        # её индекс при этом сохраняем
+        if sel and sel[0] in self._slots:
+            self._selected = self._first + self._slots.index(sel[0])
+
+    def _on_wheel(self, event) -> str:
+        if event.num == 4:
+            units = -self.WHEEL_UNITS
+        elif event.num == 5:
+            units = self.WHEEL_UNITS
+        else:
+            units = -self.WHEEL_UNITS if event.delta > 0 else self.WHEEL_UNITS
+        self._first += units
+        self._render()
+        return "break"
+
+    def _move_selection(self, delta: int) -> str:
+        n = len(self._rows)
+        if not n:
+            return "break"
+        if self._selected is None:
+            sel = min(self._first, n - 1)
+        else:
+            sel = max(0, min(n - 1, self._selected + delta))
+        self._selected = sel
+        # прокручиваем так, чтобы выделенная строка была видна целиком
+        page = self._page()
+        if sel < self._first:
+            self._first = sel
+        elif sel >= self._first + page:
+            self._first = sel - page + 1
+        self._render()
+        if self._slots:
+            self.tree.focus(self._slots[sel - self._first])
+        return "break"
+
+
+class VirtualGrid(ttk.Frame):
+    """
+    Таблица результата: Treeview (только заголовки) со скроллбарами, строки
+    которого рисует VirtualTree. Данные подменяются через set_data(columns, rows);
+    колонки перенастраиваются, только если изменился их набор.
+    """
+
+    STRIPE_BACKGROUND = "#f6f6f6"
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.tree = ttk.Treeview(self, show="headings")
+        self.vsb = ttk.Scrollbar(self, orient="vertical")
+        hsb = ttk.Scrollbar(self, orient="horizontal", command=self.tree.xview)
+        self.tree.configure(xscrollcommand=hsb.set)
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.vsb.pack(side="right", fill="y")
+        hsb.pack(side="bottom", fill="x")
+
+        self.tree.tag_configure("odd", background=self.STRIPE_BACKGROUND)
+        self._view = VirtualTree(self.tree, self.vsb, stripe_tag="odd")
+        self._columns: tuple = ()
+
+    def set_data(self, columns: Sequence[str], rows: Sequence[Any]) -> None:
+        """Показать rows (кортежи values) под заголовками columns — с начала."""
+        new_cols = tuple(columns or ())
+        if new_cols == self._columns:
+            # повторный запуск того же запроса: колонки не трогаем, меняем только строки
+            self._view.set_rows(rows)
+            return
+        self._columns = new_cols
+
+        # на время перенастройки колонок и заполнения видимого окна снимаем таблицу
+        # с экрана, чтобы Tk не пересчитывал раскладку/перерисовку на каждый вызов
+        with suspend_layout(self.tree) as tree:
+            col_head, col_conf = tree.heading, tree.column
+            for c in tree["columns"]:
+                col_head(c, text="")
+            tree["columns"] = new_cols
+            for c in new_cols:
+                col_head(c, text=c)
+                col_conf(c, width=max(80, len(c) * 8) if isinstance(c, str) else 80, stretch=True)
+            self._view.set_rows(rows)
+
+    def refresh(self, rows: Optional[Sequence[Any]] = None) -> None:
+        """Строки дополнились (в той же последовательности или в новой rows) — перерисовать видимое окно."""
+        self._view.refresh(rows)
@@ -0,0 +1,49 @@
+import logging
+import queue
+import threading
+import tkinter as tk
+from typing import Any, Callable, Optional
+
+log = logging.getLogger(__name__)
+
+
+class Worker:
+    """
+    Один фоновый поток для работы с БД.
+
+    Задачи ставятся в очередь через submit() и выполняются по порядку,
+    а результат возвращается в главный поток Tk через root.after(0, ...),
+    так что колбэки могут спокойно трогать виджеты.
+    """
+
+    def __init__(self, root: tk.Misc, name: str = "db-worker"):
+        self.root = root
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        on_done: Optional[Callable[[Any], None]] = None,
+        on_error: Optional[Callable[[Exception], None]] = None,
+    ) -> None:
+        """Поставить fn(*args) в очередь; on_done/on_error вызовутся в потоке Tk."""
+        self._queue.put((fn, args, on_done, on_error))
+
+    def _loop(self) -> None:
+        while True:
+            fn, args, on_done, on_error = self._queue.get()
+            try:
+                result = fn(*args)
+            except Exception as e:
+                if on_error is not None:
+                    self.root.after(0, on_error, e)
+                else:
+                    log.exception("background task %r failed", fn)
+            else:
+                if on_done is not None:
+                    self.root.after(0, on_done, result)
+            finally:
+                self._queue.task_done()
@@ -1,4 +1,3 @@
-import re
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 from typing import Callable
@@ -7,6 +6,9 @@ from app.repositories.meta_repository import MetaRepository
 from app.state.query_builder_state import QueryBuilderState
 from app.repositories.query_repository import QueryRepository
 
+# операторы WHERE — общий неизменяемый список для всех строк фильтра
+_WHERE_OPS = ("=", "<>", "<", ">", "<=", ">=", "LIKE", "ILIKE", "IN", "IS NULL", "IS NOT NULL", "BETWEEN")
+
 
 class TabBuilder(ttk.Frame):
     """
@@ -18,6 +20,8 @@ class TabBuilder(ttk.Frame):
     - Save
     """
 
+    PREVIEW_DEBOUNCE_MS = 30  # серия нажатий в этом окне даёт одну перестройку превью
+
     def __init__(
       self,
       parent: ttk.Notebook,
@@ -31,6 +35,26 @@ class TabBuilder(ttk.Frame):
         self.state = state
         self.on_saved = on_saved
         self.query_repo = query_repo
+        # отложенная перестройка превью (см. _schedule_preview)
+        self._preview_after_id = None
+        self._pending_where_options = False
+        # последний показанный в превью SQL — не переписываем Text без изменений
+        self._last_sql = None
+        # колонки таблиц из мета-БД: (dbname, table) -> [(name, type)]
+        self._cols_cache: dict[tuple[str, str], list[tuple[str, str]]] = {}
+        # отмеченные в SELECT колонки — зеркало checked_var без Tcl-вызовов на чтение
+        self._checked: set[str] = set()
+        # строки SELECT по имени колонки: {frame, chk, label, checked_var, alias_var}
+        self._col_rows: dict[str, dict] = {}
+        # строки WHERE по порядку: {frame, col, op, val} — без winfo_children()
+        self._where_rows: list[dict] = []
+        # значения строк WHERE параллельными списками (индекс = индекс в _where_rows)
+        self._where_cols: list[tk.StringVar] = []
+        self._where_ops: list[tk.StringVar] = []
+        self._where_vals: list[tk.StringVar] = []
+        # True, пока строки SELECT сбрасываются программно: трейсы переменных
+        # не должны планировать превью (его перестроит вызывающий код один раз)
+        self._suspend_preview = False
 
         # верхняя панель
         top = ttk.Frame(self)
@@ -116,6 +140,10 @@ class TabBuilder(ttk.Frame):
         except ValueError:
             return 0
 
+    def invalidate_columns_cache(self):
+        """Сбросить кеш колонок (после рескана схемы)."""
+        self._cols_cache.clear()
+
     def refresh_databases(self):
         """Вызывается, когда в реестре БД появились новые элементы."""
         cur = self.cmb_db.get()
@@ -125,9 +153,17 @@ class TabBuilder(ttk.Frame):
 
     # --- internal ---
 
+    def _get_columns(self, dbname: str, table: str) -> list[tuple[str, str]]:
+        key = (dbname, table)
+        cols = self._cols_cache.get(key)
+        if cols is None:
+            cols = self._cols_cache[key] = list(self.meta_repo.list_columns(dbname, table))
+        return cols
+
     def _on_db_change(self, _evt=None):
         self.state.dbname = self.cmb_db.get()
         self.state.table = None
+        self._cols_cache.clear()
         self.cmb_table.set("")
         self.cmb_table["values"] = self.meta_repo.list_tables(self.state.dbname)
         self._clear_select_where()
@@ -140,65 +176,113 @@ class TabBuilder(ttk.Frame):
         self._update_preview()
 
     def _clear_select_where(self):
-        for w in self.columns_frame.winfo_children():
-            w.destroy()
-        for w in self.where_rows_container.winfo_children():
-            w.destroy()
+        # все строки известны по ссылкам — без winfo_children()
+        for row in self._col_rows.values():
+            row["frame"].destroy()
+        self._col_rows.clear()
+        for refs in self._where_rows:
+            refs["frame"].destroy()
+        self._where_rows.clear()
+        self._where_cols.clear()
+        self._where_ops.clear()
+        self._where_vals.clear()
         self.state.selected_columns.clear()
+        self._checked.clear()
         self.state.filters.clear()
 
     def _render_select_columns(self):
-        for w in self.columns_frame.winfo_children():
-            w.destroy()
-        self.state.selected_columns.clear()
-
-        cols = self.meta_repo.list_columns(self.state.dbname, self.state.table)
-        for (col, type_family) in cols:
-            row = ttk.Frame(self.columns_frame)
-            row.pack(fill="x", pady=2)
-
-            var_chk = tk.BooleanVar(value=False)
-            var_alias = tk.StringVar(value="")
-
-            chk = ttk.Checkbutton(
-                row,
-                text=f'{col}  ({type_family})',
-                variable=var_chk,
-                command=self._on_select_changed,
-            )
-            chk.pack(side="left")
-
-            ttk.Label(row, text="AS").pack(side="left", padx=(10, 2))
-            ent = ttk.Entry(row, width=16, textvariable=var_alias)
-            ent.pack(side="left")
-
-            # обновляем превью "на лету" при наборе
-            var_alias.trace_add("write", lambda *_: self._on_alias_changed())
-
-            # валидируем по Enter и по уходу фокуса (и НЕ затираем другие обработчики)
-            ent.bind("<Return>",
-                     lambda e, v=var_alias, w=ent: self._on_alias_commit(v, w),
-                     add="+")
-            ent.bind("<FocusOut>",
-                     lambda e, v=var_alias, w=ent: self._on_alias_commit(v, w, silent=True),
-                     add="+")
-
-            # На случай, если где-то меняется значение переменной без клика по чекбоксу
-            var_chk.trace_add("write", lambda *_: self._on_select_changed())
+        """
+        Перестроить строки SELECT под текущую таблицу. Строки колонок, которые
+        есть и в новой таблице, переиспользуются (со сбросом значений);
+        создаются только новые, удаляются только пропавшие.
+        """
+        cols = self._get_columns(self.state.dbname, self.state.table)
+        new_names = {c for c, _t in cols}
+        for name in [n for n in self._col_rows if n not in new_names]:
+            self._col_rows.pop(name)["frame"].destroy()
 
-            self.state.selected_columns[col] = {"checked_var": var_chk, "alias_var": var_alias}
+        was_checked = set(self._checked)
+        self.state.selected_columns.clear()
+        self._checked.clear()
+        self._suspend_preview = True
+        try:
+            self._fill_column_rows(cols, was_checked)
+        finally:
+            self._suspend_preview = False
 
         # после первого рендера тоже синхронизируем WHERE
         self._refresh_where_comboboxes()
 
+    def _fill_column_rows(self, cols: list[tuple[str, str]], was_checked: set[str]):
+        """Создать/переиспользовать строки SELECT в порядке cols (значения сбрасываются)."""
+        # list_columns отдаёт колонки по имени, поэтому оставшиеся строки уже
+        # стоят в нужном порядке — новые достаточно вставить между ними
+        first_kept = next((self._col_rows[c]["frame"] for c, _t in cols if c in self._col_rows), None)
+        prev = None
+        for (col, type_family) in cols:
+            label = f'{col}  ({type_family})'
+            row = self._col_rows.get(col)
+            if row is None:
+                row = self._col_rows[col] = self._create_column_row(col, label)
+                if prev is not None:
+                    row["frame"].pack(fill="x", pady=2, after=prev)
+                elif first_kept is not None:
+                    row["frame"].pack(fill="x", pady=2, before=first_kept)
+                else:
+                    row["frame"].pack(fill="x", pady=2)
+            else:
+                if row["label"] != label:
+                    row["chk"].configure(text=label)
+                    row["label"] = label
+                if col in was_checked:
+                    row["checked_var"].set(False)
+                if row["alias_var"].get():
+                    row["alias_var"].set("")
+            prev = row["frame"]
+            self.state.selected_columns[col] = {"checked_var": row["checked_var"], "alias_var": row["alias_var"]}
+
+    def _create_column_row(self, col: str, label: str) -> dict:
+        """Виджеты одной строки SELECT (ещё не упакованная рамка)."""
+        row = ttk.Frame(self.columns_frame)
+
+        var_chk = tk.BooleanVar(value=False)
+        var_alias = tk.StringVar(value="")
+
+        chk = ttk.Checkbutton(
+            row,
+            text=label,
+            variable=var_chk,
+        )
+        chk.pack(side="left")
+
+        ttk.Label(row, text="AS").pack(side="left", padx=(10, 2))
+        ent = ttk.Entry(row, width=16, textvariable=var_alias)
+        ent.pack(side="left")
+
+        # обновляем превью "на лету" при наборе
+        var_alias.trace_add("write", lambda *_: self._on_alias_changed())
+
+        # валидируем по Enter и по уходу фокуса (и НЕ затираем другие обработчики)
+        ent.bind("<Return>",
+                 lambda e, v=var_alias, w=ent: self._on_alias_commit(v, w),
+                 add="+")
+        ent.bind("<FocusOut>",
+                 lambda e, v=var_alias, w=ent: self._on_alias_commit(v, w, silent=True),
+                 add="+")
+
+        # клик по чекбоксу и программная смена значения приходят сюда же
+        var_chk.trace_add("write", lambda *_, c=col, v=var_chk: self._on_check_toggled(c, v))
+
+        return {"frame": row, "chk": chk, "label": label,
+                "checked_var": var_chk, "alias_var": var_alias}
+
     def _is_valid_identifier(self, name: str) -> bool:
         """
         Пустая строка допустима (алиас не задан).
         Иначе: латиница/цифры/_, но начинаться с буквы или _.
         """
-        if not name:
-            return True
-        return re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', name) is not None
+        # для ASCII isidentifier() — ровно этот шаблон, но без regex
+        return not name or (name.isascii() and name.isidentifier())
 
     def _on_alias_commit(self, var: tk.StringVar, entry: ttk.Entry, silent: bool = False):
         """
@@ -228,6 +312,8 @@ class TabBuilder(ttk.Frame):
 
     def _on_alias_changed(self):
         """Алиас изменился — обновим превью (и только его)."""
+        if self._suspend_preview:
+            return
         self._update_preview()
 
     def _add_where_row(self):
@@ -235,21 +321,28 @@ class TabBuilder(ttk.Frame):
         row.pack(fill="x", pady=2)
 
         # показываем только отмеченные в SELECT; если их нет — все колонки таблицы
-        selected = self._selected_columns()
-        if not selected:
-            selected = [c for (c, _t) in self.meta_repo.list_columns(self.state.dbname or "", self.state.table or "")]
+        selected = self._where_options()
+
+        var_col, var_op, var_val = tk.StringVar(), tk.StringVar(), tk.StringVar()
 
-        cmb_col = ttk.Combobox(row, values=selected, state="readonly", width=18)
+        cmb_col = ttk.Combobox(row, values=selected, state="readonly", width=18, textvariable=var_col)
         cmb_col.pack(side="left")
 
-        ops = ["=", "<>", "<", ">", "<=", ">=", "LIKE", "ILIKE", "IN", "IS NULL", "IS NOT NULL", "BETWEEN"]
-        cmb_op = ttk.Combobox(row, values=ops, state="readonly", width=10)
+        cmb_op = ttk.Combobox(row, values=_WHERE_OPS, state="readonly", width=10, textvariable=var_op)
         cmb_op.pack(side="left", padx=4)
 
-        ent_val = ttk.Entry(row, width=22)
+        ent_val = ttk.Entry(row, width=22, textvariable=var_val)
         ent_val.pack(side="left", padx=4)
 
+        refs = {"frame": row, "col": cmb_col, "op": cmb_op, "val": ent_val}
+        self._where_rows.append(refs)
+        self._where_cols.append(var_col)
+        self._where_ops.append(var_op)
+        self._where_vals.append(var_val)
+
         def remove_row():
+            i = self._where_rows.index(refs)
+            del self._where_rows[i], self._where_cols[i], self._where_ops[i], self._where_vals[i]
             row.destroy()
             self._update_preview()
         ttk.Button(row, text="×", width=3, command=remove_row).pack(side="left", padx=4)
@@ -261,22 +354,29 @@ class TabBuilder(ttk.Frame):
 
         self._update_preview()
 
-    def _collect_state(self):
+    def _collect_state(self, where_options: list[str] | None = None):
+        """
+        Собрать состояние из виджетов одним проходом. Если передан where_options —
+        в том же цикле по строкам WHERE обновляются и списки колонок в Combobox'ах.
+        """
         # SELECT
-        for name, meta in list(self.state.selected_columns.items()):
-            meta["checked"] = meta["checked_var"].get()
+        for name, meta in self.state.selected_columns.items():
+            meta["checked"] = name in self._checked
             meta["alias"] = meta["alias_var"].get().strip()
 
         # WHERE
         filters = []
-        for row in self.where_rows_container.winfo_children():
-            widgets = row.winfo_children()
-            if len(widgets) < 3:
-                continue
-            cmb_col, cmb_op, ent_val = widgets[0], widgets[1], widgets[2]
-            col = cmb_col.get().strip()
-            op = cmb_op.get().strip()
-            val = ent_val.get().strip()
+        for refs, var_col, var_op, var_val in zip(self._where_rows, self._where_cols,
+                                                  self._where_ops, self._where_vals):
+            col = var_col.get().strip()
+            if where_options is not None:
+                refs["col"]["values"] = where_options
+                # если текущего значения больше нет — очистим
+                if col and col not in where_options:
+                    var_col.set("")
+                    col = ""
+            op = var_op.get().strip()
+            val = var_val.get().strip()
             if not col or not op:
                 continue
             filters.append({"column": col, "op": op, "value": val})
@@ -286,8 +386,34 @@ class TabBuilder(ttk.Frame):
         self.state.limit = self._limit_value()
 
     def _update_preview(self):
-        self._collect_state()
-        sql = self.state.build_sql()
+        """Запросить обновление превью; частые вызовы схлопываются в один."""
+        self._schedule_preview()
+
+    def _schedule_preview(self, update_where_options: bool = False):
+        # флаг копится, пока обновление не выполнено
+        self._pending_where_options = self._pending_where_options or update_where_options
+        if self._preview_after_id is not None:
+            self.after_cancel(self._preview_after_id)
+        self._preview_after_id = self.after(self.PREVIEW_DEBOUNCE_MS, self._do_update_preview)
+
+    def _do_update_preview(self):
+        """Выполнить отложенное обновление прямо сейчас."""
+        if self._preview_after_id is not None:
+            self.after_cancel(self._preview_after_id)
+            self._preview_after_id = None
+        update_where_options, self._pending_where_options = self._pending_where_options, False
+        self._apply_change(update_where_options)
+
+    def _apply_change(self, update_where_options: bool = False):
+        """
+        Один проход по виджетам: состояние (+ опции WHERE, если нужно) и превью SQL.
+        Алиасы/значения фильтров зовут его без update_where_options.
+        """
+        self._collect_state(self._where_options() if update_where_options else None)
+        sql = self.state.render_sql()
+        if sql == self._last_sql:
+            return
+        self._last_sql = sql
         self.txt_preview.configure(state="normal")
         self.txt_preview.delete("1.0", "end")
         self.txt_preview.insert("1.0", sql)
@@ -302,7 +428,9 @@ class TabBuilder(ttk.Frame):
             messagebox.showwarning("Select DB", "Choose a database first.")
             return
 
-        sql = self.state.build_sql()
+        # отложенное обновление могло ещё не сработать — синхронизируем состояние
+        self._do_update_preview()
+        sql = self.state.render_sql()
         try:
             db_id = self.meta_repo.get_database_id(self.state.dbname)
             saved_id = self.query_repo.save_query(db_id, title, sql)
@@ -317,29 +445,37 @@ class TabBuilder(ttk.Frame):
 
     def _selected_columns(self) -> list[str]:
         """Возвращает список колонок, отмеченных в SELECT."""
-        return [
-            name for name, meta in self.state.selected_columns.items()
-            if meta["checked_var"].get()
-        ]
+        # порядок — как в списке колонок таблицы
+        return [name for name in self.state.selected_columns if name in self._checked]
 
-    def _refresh_where_comboboxes(self):
-        """В Combobox'ах WHERE показываем только отмеченные в SELECT (или все, если ничего не отмечено)."""
+    def _where_options(self) -> list[str]:
+        """Колонки для Combobox'ов WHERE: отмеченные в SELECT или все, если ничего не отмечено."""
         selected = self._selected_columns()
         if not selected:
-            selected = [c for (c, _t) in self.meta_repo.list_columns(self.state.dbname or "", self.state.table or "")]
+            selected = [c for (c, _t) in self._get_columns(self.state.dbname or "", self.state.table or "")]
+        return selected
 
-        for row in self.where_rows_container.winfo_children():
-            widgets = row.winfo_children()
-            if not widgets:
-                continue
-            cmb_col = widgets[0]
-            if isinstance(cmb_col, ttk.Combobox):
-                cmb_col["values"] = selected
-                # если текущего значения больше нет — очистим
-                if cmb_col.get() and cmb_col.get() not in selected:
-                    cmb_col.set("")
+    def _refresh_where_comboboxes(self):
+        """В Combobox'ах WHERE показываем только отмеченные в SELECT (или все, если ничего не отмечено)."""
+        selected = self._where_options()
+
+        for refs, var_col in zip(self._where_rows, self._where_cols):
+            refs["col"]["values"] = selected
+            # если текущего значения больше нет — очистим
+            current = var_col.get()
+            if current and current not in selected:
+                var_col.set("")
+
+    def _on_check_toggled(self, col: str, var: tk.BooleanVar):
+        """Синхронизировать _checked с переменной чекбокса (один Tcl get на переключение)."""
+        if var.get():
+            self._checked.add(col)
+        else:
+            self._checked.discard(col)
+        self._on_select_changed()
 
     def _on_select_changed(self):
-        """Реакция на переключение чекбоксов SELECT."""
-        self._update_preview()
-        self._refresh_where_comboboxes()
+        """Реакция на переключение чекбоксов SELECT: превью и опции WHERE за один проход."""
+        if self._suspend_preview:
+            return
+        self._schedule_preview(update_where_options=True)
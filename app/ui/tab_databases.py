@@ -10,7 +10,7 @@ class TabDatabases(ttk.Frame):
     Вкладка 1: Реестр БД
     - список подключённых БД (из meta_repo)
     - Add database (модалка)
-    - Rescan schema (заглушка-колбэк)
+    - Rescan schema (делегируется в on_rescan, который не блокирует UI)
     """
 
     def __init__(
@@ -43,14 +43,27 @@ class TabDatabases(ttk.Frame):
         sb.pack(side="right", fill="y")
         self.lst.configure(yscrollcommand=sb.set)
 
+        # показанный список имён — refresh_list() без изменений ничего не трогает
+        self._names: tuple[str, ...] = ()
         self.refresh_list()
 
     # --- public ---
 
     def refresh_list(self):
-        self.lst.delete(0, "end")
-        for name in self.meta_repo.list_databases():
-            self.lst.insert("end", name)
+        new = tuple(self.meta_repo.list_databases())
+        if new == self._names:
+            return
+        # общий префикс оставляем, хвост заменяем одним delete и одним insert
+        keep = 0
+        for old_name, new_name in zip(self._names, new):
+            if old_name != new_name:
+                break
+            keep += 1
+        if keep < len(self._names):
+            self.lst.delete(keep, "end")
+        if keep < len(new):
+            self.lst.insert("end", *new[keep:])
+        self._names = new
 
     # --- private ---
 
@@ -64,11 +77,11 @@ class TabDatabases(ttk.Frame):
             self.refresh_list()
             if self.on_registry_changed:
                 self.on_registry_changed()
-            # сразу обновим схему после добавления
-            self.meta_repo.rescan_schema(name)
-            messagebox.showinfo("Scan", f"Schema for '{name}' scanned and saved.")
         except Exception as e:
             messagebox.showerror("Error", str(e))
+            return
+        # сразу обновим схему после добавления (в фоне, см. on_rescan)
+        self.on_rescan(name)
 
     def _rescan_selected_db(self):
         sel = self.lst.curselection()
@@ -76,9 +89,4 @@ class TabDatabases(ttk.Frame):
             messagebox.showwarning("Select DB", "Please select a database.")
             return
         dbname = self.lst.get(sel[0])
-        try:
-            messagebox.showinfo("Rescan", f"Scanning schema for '{dbname}'...")
-            self.meta_repo.rescan_schema(dbname)
-            messagebox.showinfo("Rescan", f"Schema for '{dbname}' updated.")
-        except Exception as e:
-            messagebox.showerror("Rescan error", str(e))
+        self.on_rescan(dbname)
@@ -1,8 +1,18 @@
+import re
+import threading
+import time
 import tkinter as tk
 from tkinter import ttk, messagebox
 from typing import Callable, List, Dict, Optional
 
+from app.repositories.query_repository import HistoryEntry, SavedQuery
 from app.services.query_service import QueryService
+from app.ui._virtual_tree import VirtualGrid, VirtualTree, suspend_layout
+from app.ui._worker import Worker
+
+# однострочное превью SQL: любые пробелы (включая NBSP) — в один пробел за проход re
+_WS_RE = re.compile(r"[\s\u00A0]+")
+
 
 class TabLibrary(ttk.Frame):
     """
@@ -11,18 +21,27 @@ class TabLibrary(ttk.Frame):
     - история запусков (из БД)
     """
 
+    LIST_CACHE_TTL = 30.0  # сек: повторный выбор того же фильтра не ходит в БД
+    REFRESH_DEBOUNCE_MS = 150  # листание фильтра стрелками даёт одно обновление списков
+    DB_CHOICES_TTL = 60.0  # сек: список БД для фильтра меняется редко
+    SQL_PREVIEW_CHARS = 400  # колонка SQL (1600 px) всё равно показывает меньше
+    SAVED_PAGE = 200     # сохранённые читаем из БД страницами по мере прокрутки
+    HISTORY_LIMIT = 100  # в истории показываем последние запуски
+
     def __init__(
       self,
       parent: ttk.Notebook,
       get_db_choices: Callable[[], List[tuple[int, str]]],
-      get_saved: Callable[[Optional[int]], List[Dict]],
-      get_history: Callable[[Optional[int]], List[Dict]],
+      get_saved: Callable[[Optional[int], Optional[int], int], List[SavedQuery]],
+      count_saved: Callable[[Optional[int]], int],
+      get_history: Callable[[Optional[int], int, int], List[HistoryEntry]],
       delete_saved: Callable[[int], None],
       query_service: QueryService,
     ):
         super().__init__(parent)
         self.get_db_choices = get_db_choices
         self.get_saved = get_saved
+        self.count_saved = count_saved
         self.get_history = get_history
         self.delete_saved_cb = delete_saved
         self.query_service = query_service
@@ -34,9 +53,32 @@ class TabLibrary(ttk.Frame):
         ttk.Label(top, text="Database:").pack(side="left")
         self.cmb_db = ttk.Combobox(top, state="readonly", width=28)
         self.cmb_db.pack(side="left", padx=6)
-        self.cmb_db.bind("<<ComboboxSelected>>", lambda e: self.refresh_lists())
+        self.cmb_db.bind("<<ComboboxSelected>>", self._schedule_refresh)
+        self._refresh_after_id: Optional[str] = None
         self._db_id_by_name = {}
-        self._fill_db_filter()
+        self._db_choices_cache: Optional[List[tuple[int, str]]] = None
+        self._db_choices_mtime: float = 0.0
+        # фильтр БД и списки грузим при первом показе вкладки (ensure_loaded)
+        self._loaded = False
+        # «подписи» показанных списков: если данные не изменились — не перерисовываем
+        self._saved_sig = None
+        self._history_sig = None
+        # ответы get_saved/count_saved/get_history: (вид, db_id, ...) -> (время, значение)
+        self._list_cache: Dict[tuple, tuple] = {}
+        self._list_cache_lock = threading.Lock()  # кеш читается из фонового потока
+        # id сохранённого запроса -> запись из _saved_cache
+        self._saved_by_id: Dict[int, SavedQuery] = {}
+        # постраничный список сохранённых: _saved_cache длиной во весь список,
+        # ещё не прочитанные строки — None; _saved_pages — загруженные/запрошенные страницы
+        self._saved_cache: List[Optional[SavedQuery]] = []
+        self._saved_rows: List[tuple] = []
+        self._saved_pages: set[int] = set()
+        self._saved_db_id: Optional[int] = None
+        self._saved_gen = 0  # растёт при каждой перестройке списка — старые страницы отбрасываем
+        # id сохранённого запроса -> однострочное превью SQL (текст запроса не меняется)
+        self._sql_preview_cache: Dict[int, str] = {}
+        # id -> текст запроса с NBSP, заменёнными на пробелы (для превью и запуска)
+        self._sql_norm_cache: Dict[int, str] = {}
 
         # ====== основной Layout: вертикальный сплитер ======
         root_pan = ttk.Panedwindow(self, orient="vertical")
@@ -69,106 +111,314 @@ class TabLibrary(ttk.Frame):
         self.tbl_saved.pack(side="left", fill="both", expand=True, padx=8, pady=8)
         vsb_left.pack(side="right", fill="y")
         hsb_left.pack(side="bottom", fill="x")
+        # в виджете — только видимые строки, весь список — в _saved_cache
+        self._saved_view = VirtualTree(self.tbl_saved, vsb_left, on_window=self._on_saved_window)
+        # двойной клик — просмотр полного SQL без запуска
+        self.tbl_saved.bind("<Double-Button-1>", self._view_saved_sql)
+        self._sql_view_win: Optional[tk.Toplevel] = None
+        self._sql_view_text: Optional[tk.Text] = None
 
         # History (справа)
         right = ttk.Labelframe(top_pan, text="Run history")
         top_pan.add(right, weight=1)
 
-        self.list_history = tk.Listbox(right)
+        # содержимое списка — через listvariable: всё обновление одним set()
+        self._hist_var = tk.Variable(value=())
+        self.list_history = tk.Listbox(right, listvariable=self._hist_var)
         self.list_history.pack(fill="both", expand=True, padx=8, pady=8)
 
         # ---- нижняя часть: Result
         res = ttk.Labelframe(root_pan, text="Result")
         root_pan.add(res, weight=3)
 
-        self.result_tree = ttk.Treeview(res, show="headings")
-        vsb = ttk.Scrollbar(res, orient="vertical", command=self.result_tree.yview)
-        hsb = ttk.Scrollbar(res, orient="horizontal", command=self.result_tree.xview)
-        self.result_tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
-        self.result_tree.pack(side="left", fill="both", expand=True)
-        vsb.pack(side="right", fill="y")
-        hsb.pack(side="bottom", fill="x")
+        # весь результат (list или SpilledRows) держим в Python, в виджете — видимое окно
+        self.result_tree = VirtualGrid(res)
+        self.result_tree.pack(fill="both", expand=True)
+        self._rows_cache = []
 
         # ---- общие кнопки снизу
         btns = ttk.Frame(self)
         btns.pack(fill="x", padx=10, pady=(0, 10))
         ttk.Button(btns, text="Run", command=self._run_saved).pack(side="left", padx=6)
         ttk.Button(btns, text="Delete", command=self._delete_saved).pack(side="left", padx=6)
+        # итог запуска — в строке статуса, без модального окна
+        self.lbl_status = ttk.Label(btns, text="")
+        self.lbl_status.pack(side="right", padx=6)
+
+        # запросы к БД — в фоновых потоках (списки отдельно от запуска запросов,
+        # чтобы долгий SELECT не задерживал их); результат применяется в потоке Tk,
+        # ответы устаревших запросов отбрасываются
+        self._worker = Worker(self, name="library-lists")
+        self._run_worker = Worker(self, name="library-run")
+        self._refresh_token = 0
+        self._run_token = 0
+        self._streamed_token = 0  # запуск, чьи колонки уже выставлены в result_tree
+        # последнее (token, columns, rows) потокового запуска и флаг «уведомление уже в очереди Tk»
+        self._stream_latest = (0, None, None)
+        self._stream_pending = threading.Event()
+        self._busy = 0
+
+        # F5 — перечитать списки из БД в обход кеша
+        for w in (self.cmb_db, self.tbl_saved, self.list_history):
+            w.bind("<F5>", lambda e: self._force_refresh(), add="+")
+
+        # подписываемся на событие логирования истории: список перечитывается,
+        # когда запись уже в БД (при async_history — после сброса пачки)
+        self._history_hooked = hasattr(self.query_service, "on_logged")
+        if self._history_hooked:
+            self.query_service.on_logged = lambda entry: self.after(0, self._on_history_logged)
 
-        self.refresh_lists()
+    # --- public ---
 
-        # подписываемся на событие логирования истории
-        if hasattr(self.query_service, "on_logged"):
-            self.query_service.on_logged = lambda entry: self.after(0, self.refresh_lists)
+    def ensure_loaded(self):
+        """Показ вкладки: в первый раз — фильтр БД и списки, дальше — только фильтр (из кеша)."""
+        if self._loaded:
+            self._fill_db_filter()
+            return
+        self._loaded = True
+        self._fill_db_filter()
+        self.refresh_lists()
 
-    # --- public ---
+    def invalidate_db_choices(self):
+        """Реестр БД изменился: перечитать список для фильтра."""
+        self._db_choices_cache = None
+        if self._loaded:
+            self._fill_db_filter()
+
+    def invalidate_cache(self, kind: Optional[str] = None):
+        """Сбросить кеш списков: kind = "saved" | "history" | None (оба)."""
+        with self._list_cache_lock:
+            if kind is None:
+                self._list_cache.clear()
+                return
+            for key in [k for k in self._list_cache if k[0] == kind]:
+                del self._list_cache[key]
 
     def refresh_lists(self):
-        db_id = self._current_db_id()
-        self._refresh_saved(db_id)
-        self._refresh_history(db_id)
+        """Обновить списки сейчас (отложенное обновление по фильтру отменяется)."""
+        if self._refresh_after_id is not None:
+            self.after_cancel(self._refresh_after_id)
+            self._refresh_after_id = None
+        self._do_refresh()
 
     # --- private ---
 
-    def _refresh_saved(self, db_id):
-        self._saved_cache = self.get_saved(db_id)  # [{id, title, sql_text, created_at, db_name?...}]
-        # очистка
-        for iid in self.tbl_saved.get_children():
-            self.tbl_saved.delete(iid)
-
-        # вставка
-        for i, q in enumerate(self._saved_cache):
-            created = q.get("created_at", "")
-            title = q.get("title", "")
-            sql_raw = (q.get("sql_text") or "").replace("\u00A0", " ")
+    def _schedule_refresh(self, _evt=None):
+        # выбор в фильтре: обновляемся, когда выбор успокоится
+        if self._refresh_after_id is not None:
+            self.after_cancel(self._refresh_after_id)
+        self._refresh_after_id = self.after(self.REFRESH_DEBOUNCE_MS, self.refresh_lists)
 
-            one_line_sql = " ".join(sql_raw.split())
-            sql_short = one_line_sql
+    def _do_refresh(self):
+        # пока вкладку не открывали — обновлять нечего, данные загрузятся при показе
+        if not self._loaded:
+            return
+        db_id = self._current_db_id()
+        self._refresh_token += 1
+        token = self._refresh_token
+        self._set_busy(True)
+        self._worker.submit(
+            self._load_lists, db_id,
+            on_done=lambda res: self._apply_lists(token, res),
+            on_error=lambda e: self._on_lists_error(token, e),
+        )
+
+    def _load_lists(self, db_id: Optional[int]):
+        """
+        Фоновый поток (через кеш): число сохранённых, их первая страница
+        и последние HISTORY_LIMIT запусков для фильтра.
+        """
+        total = self._cached(("saved", db_id, "count"), lambda: self.count_saved(db_id))
+        first = self._cached(("saved", db_id, 0), lambda: self.get_saved(db_id, self.SAVED_PAGE, 0))
+        history = self._cached(("history", db_id),
+                               lambda: self.get_history(db_id, self.HISTORY_LIMIT, 0))
+        return db_id, total, first, history
+
+    def _apply_lists(self, token: int, res):
+        self._set_busy(False)
+        if token != self._refresh_token:
+            return  # пока грузили, фильтр успели сменить
+        db_id, total, first, history = res
+        self._show_saved(db_id, total, first)
+        self._show_history(history)
+
+    def _on_lists_error(self, token: int, e: Exception):
+        self._set_busy(False)
+        if token == self._refresh_token:
+            messagebox.showerror("Library", str(e))
+
+    def _set_busy(self, busy: bool):
+        # курсор «часы», пока есть незавершённые фоновые запросы
+        self._busy += 1 if busy else -1
+        self.configure(cursor="watch" if self._busy > 0 else "")
+
+    def _cached(self, key: tuple, load: Callable[[], object]):
+        # key[0] — вид списка ("saved" | "history"), по нему работает invalidate_cache
+        with self._list_cache_lock:
+            hit = self._list_cache.get(key)
+        now = time.monotonic()
+        if hit is not None and now - hit[0] < self.LIST_CACHE_TTL:
+            return hit[1]
+        rows = load()
+        with self._list_cache_lock:
+            self._list_cache[key] = (now, rows)
+        return rows
+
+    def _force_refresh(self):
+        self.invalidate_cache()
+        self.refresh_lists()
 
-            iid = str(q.get("id", i))  # стабильный ключ строки
-            self.tbl_saved.insert("", "end", iid=iid,
-                                  values=(created, title, sql_short))
+    def _on_history_logged(self):
+        # пачка истории записана — закешированная history устарела
+        self.invalidate_cache("history")
+        self.refresh_lists()
 
-    def _refresh_history(self, db_id: Optional[int]):
-        self._history_cache = self.get_history(db_id) or []
+    def _show_saved(self, db_id: Optional[int], total: int, first_page):
+        sig = (db_id, total, tuple((q.id, q.created_at, q.title, q.sql_text) for q in first_page))
+        if sig == self._saved_sig:
+            return
+        self._saved_sig = sig
+
+        # список длиной total: прочитана только первая страница, остальные —
+        # по мере прокрутки (_on_saved_window)
+        n = max(total, len(first_page))
+        self._saved_gen += 1
+        self._saved_db_id = db_id
+        self._saved_cache = [None] * n  # [SavedQuery | None]
+        self._saved_rows = [("", "…", "")] * n
+        self._saved_pages = {0}
+        self._saved_by_id = {}
+        self._put_saved_page(0, first_page)
+        # строки виджета — кольцо видимых, индекс выделения = индекс в _saved_cache;
+        # перезапись всего окна — с таблицей, снятой с экрана
+        with suspend_layout(self.tbl_saved):
+            self._saved_view.set_rows(self._saved_rows)
+
+    def _put_saved_page(self, offset: int, page):
+        """Положить страницу сохранённых в кеш и в строки для виджета."""
+        # атрибуты и связанные методы — в локальные переменные до цикла
+        cache, rows, by_id = self._saved_cache, self._saved_rows, self._saved_by_id
+        preview_get, previews = self._sql_preview_cache.get, self._sql_preview_cache
+        ws_sub, limit = _WS_RE.sub, self.SQL_PREVIEW_CHARS
+        for i, q in enumerate(page[:max(0, len(cache) - offset)], offset):
+            qid = q.id
+            sql_short = preview_get(qid)
+            if sql_short is None:
+                sql_short = previews[qid] = ws_sub(" ", q.sql_text or "").strip()[:limit]
+
+            cache[i] = q
+            rows[i] = (q.created_at or "", q.title or "", sql_short)
+            by_id[qid] = q
+
+    def _on_saved_window(self, first: int, count: int):
+        """VirtualTree показал строки [first, first+count) — дочитать недостающие страницы."""
+        if not count:
+            return
+        size = self.SAVED_PAGE
+        for page_no in range(first // size, (first + count - 1) // size + 1):
+            if page_no in self._saved_pages:
+                continue
+            self._saved_pages.add(page_no)
+            gen, db_id, offset = self._saved_gen, self._saved_db_id, page_no * size
+            self._worker.submit(
+                self._cached, ("saved", db_id, offset),
+                lambda db_id=db_id, offset=offset: self.get_saved(db_id, size, offset),
+                on_done=lambda page, gen=gen, offset=offset: self._apply_saved_page(gen, offset, page),
+                on_error=lambda e, gen=gen, page_no=page_no: self._on_saved_page_error(gen, page_no),
+            )
+
+    def _apply_saved_page(self, gen: int, offset: int, page):
+        if gen != self._saved_gen:
+            return  # список уже перестроен (другой фильтр/обновление)
+        self._put_saved_page(offset, page)
+        self._saved_view.refresh()
+
+    def _on_saved_page_error(self, gen: int, page_no: int):
+        # страницу можно будет запросить снова при следующей прокрутке
+        if gen == self._saved_gen:
+            self._saved_pages.discard(page_no)
+
+    def _sql_norm(self, q: SavedQuery) -> str:
+        """Текст сохранённого запроса без NBSP — считаем один раз на id."""
+        qid = q.id
+        sql = self._sql_norm_cache.get(qid)
+        if sql is None:
+            sql = self._sql_norm_cache[qid] = (q.sql_text or "").replace("\u00A0", " ")
+        return sql
+
+    def _show_history(self, history):
+        self._history_cache = history or []
 
         # Если репозиторий не сортирует — отсортируем тут по created_at убыв.
         try:
-            self._history_cache.sort(key=lambda h: h.get("created_at", ""), reverse=True)
+            self._history_cache.sort(key=lambda h: h.created_at, reverse=True)
         except Exception:
             pass
 
-        self.list_history.delete(0, "end")
-        for h in self._history_cache:
-            ok = "✔" if h.get("ok") else "✖"
-            ms = h.get("duration_ms", 0)
-            created = h.get("created_at", "")
-            sql_head = (h.get("sql_text", "") or "")[:60]
-            self.list_history.insert("end", f"{ok} {ms} ms • {created} • {sql_head}…")
+        sig = tuple((h.created_at, h.ok, h.duration_ms, (h.sql_text or "")[:60])
+                    for h in self._history_cache)
+        if sig == self._history_sig:
+            return
+        self._history_sig = sig
+
+        lines = [
+            f"{'✔' if h.ok else '✖'} {h.duration_ms or 0} ms • "
+            f"{h.created_at or ''} • {(h.sql_text or '')[:60]}…"
+            for h in self._history_cache
+        ]
+        # весь список — одним присваиванием связанной переменной
+        self._hist_var.set(tuple(lines))
 
         # Показать верх (где теперь новые записи)
         self.list_history.yview_moveto(0)
 
-    def _idx(self, listbox: tk.Listbox):
-        sel = listbox.curselection()
-        return sel[0] if sel else None
-
-    def _view_saved_sql(self):
-        idx = self._idx(self.list_saved)
-        if idx is None:
+    def _view_saved_sql(self, event=None):
+        # двойной клик по заголовку/пустому месту — не строка
+        if event is not None and self.tbl_saved.identify_region(event.x, event.y) != "cell":
+            return
+        saved_id = self._saved_selected_id()
+        if saved_id is None:
+            return
+        q = self._saved_by_id.get(saved_id)
+        if not q:
             return
-        q = self._saved_cache[idx]
-        messagebox.showinfo(f"SQL • {q.get('title','')}", q.get("sql_text", ""))
+
+        # немодальное окно просмотра: одно на вкладку, при повторном вызове переиспользуется
+        win = self._sql_view_win
+        if win is None or not win.winfo_exists():
+            win = self._sql_view_win = tk.Toplevel(self)
+            win.geometry("640x360")
+            txt = tk.Text(win, wrap="none", state="disabled")  # read-only
+            vsb = ttk.Scrollbar(win, orient="vertical", command=txt.yview)
+            hsb = ttk.Scrollbar(win, orient="horizontal", command=txt.xview)
+            txt.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+            vsb.pack(side="right", fill="y")
+            hsb.pack(side="bottom", fill="x")
+            txt.pack(fill="both", expand=True)
+            win.bind("<Escape>", lambda e: win.destroy())
+            self._sql_view_text = txt
+
+        win.title(f"SQL • {q.title or ''}")
+        txt = self._sql_view_text
+        txt.configure(state="normal")
+        txt.delete("1.0", "end")
+        txt.insert("1.0", q.sql_text or "")
+        txt.configure(state="disabled")
+        win.deiconify()
+        win.lift()
 
     def _delete_saved(self):
         saved_id = self._saved_selected_id()
         if saved_id is None:
             return
-        q = next((x for x in self._saved_cache if int(x["id"]) == saved_id), None)
-        title = q.get("title", "") if q else ""
+        q = self._saved_by_id.get(saved_id)
+        title = q.title if q else ""
         if messagebox.askyesno("Delete", f"Delete saved query '{title}'?"):
             try:
                 self.delete_saved_cb(saved_id)
+                self._sql_preview_cache.pop(saved_id, None)
+                self._sql_norm_cache.pop(saved_id, None)
+                self.invalidate_cache("saved")
                 self.refresh_lists()
             except Exception as e:
                 messagebox.showerror("Delete failed", str(e))
@@ -179,35 +429,83 @@ class TabLibrary(ttk.Frame):
             messagebox.showwarning("Run", "Select a saved query.")
             return
         # достанем объект из кэша
-        q = next((x for x in self._saved_cache if int(x["id"]) == saved_id), None)
+        q = self._saved_by_id.get(saved_id)
         if not q:
             return
 
-        dbname = q.get("db_name")
+        dbname = q.db_name
         if not dbname:
             messagebox.showerror("Run", "Can't detect database for this query.")
             return
 
-        sql = (q.get("sql_text") or "").replace("\u00A0", " ")
-        res = self.query_service.run(dbname, sql)
+        sql = self._sql_norm(q)
+        self._run_token += 1
+        token = self._run_token
+        self._set_busy(True)
+        self._run_worker.submit(
+            self._stream_run, token, dbname, sql,
+            on_done=lambda res: self._on_run_done(token, res),
+            on_error=lambda e: self._on_run_done(token, {"ok": False, "error": str(e)}),
+        )
+
+    def _stream_run(self, token: int, dbname: str, sql: str) -> dict:
+        """
+        Фоновый поток: читаем результат пачками (run_iter) — таблица заполняется,
+        пока запрос дочитывается. В поток Tk уходит не каждая пачка: последнее
+        состояние лежит в _stream_latest, и новое уведомление ставится, только
+        когда предыдущее уже обработано, — очередь событий Tk не растёт.
+        """
+        t0 = time.perf_counter()
+        cols, rows = None, None
+        for cols, rows in self.query_service.run_iter(dbname, sql):
+            self._stream_latest = (token, cols, rows)
+            if not self._stream_pending.is_set():
+                self._stream_pending.set()
+                self.after(0, self._on_run_chunk)
+        return {"ok": True, "columns": cols, "rows": rows,
+                "duration_ms": round((time.perf_counter() - t0) * 1000)}
+
+    def _on_run_chunk(self):
+        # флаг снимаем до чтения состояния: пачка, пришедшая после, поставит новое уведомление
+        self._stream_pending.clear()
+        token, cols, rows = self._stream_latest
+        self._show_streamed(token, cols, rows)
+
+    def _show_streamed(self, token: int, cols, rows):
+        if token != self._run_token or cols is None:
+            return
+        if self._streamed_token != token:
+            # первое состояние запуска: колонки и строки с начала
+            self._streamed_token = token
+            self._fill_results(cols, rows)
+            return
+        # тот же список дополнился или результат выгружен в SpilledRows — позицию не сбрасываем
+        self._rows_cache = rows
+        self.result_tree.refresh(rows)
+
+    def _on_run_done(self, token: int, res: dict):
+        self._set_busy(False)
+        if token != self._run_token:
+            return  # уже запущен другой запрос — этот результат не показываем
         if not res.get("ok", True):
             messagebox.showerror("Query error", res.get("error") or "Unknown error")
             return
 
-        self._fill_results(res.get("columns", []), res.get("rows", []))
-        self._refresh_history(self._current_db_id())
-        messagebox.showinfo("Result", f"Rows: {len(res.get('rows', []))}, duration: {res.get('duration_ms', 0)} ms")
+        # последнее состояние могло быть пропущено при объединении уведомлений
+        self._show_streamed(token, res.get("columns"), res.get("rows"))
+        if self._streamed_token != token:
+            # запрос без результата — очистим таблицу
+            self._fill_results([], [])
+        if not self._history_hooked:
+            # без on_logged узнать о записи истории больше неоткуда — перечитаем сейчас
+            self.invalidate_cache("history")
+            self.refresh_lists()
+        self.lbl_status.configure(text=f"Rows: {len(self._rows_cache)} • {res.get('duration_ms', 0)} ms")
 
     def _fill_results(self, columns, rows):
-        for c in self.result_tree["columns"]:
-            self.result_tree.heading(c, text="")
-        self.result_tree.delete(*self.result_tree.get_children())
-        self.result_tree["columns"] = columns or []
-        for c in columns:
-            self.result_tree.heading(c, text=c)
-            self.result_tree.column(c, width=max(80, len(str(c)) * 8), stretch=True)
-        for r in rows:
-            self.result_tree.insert("", "end", values=r)
+        # весь результат (list или SpilledRows) — в _rows_cache, в виджете только видимое окно
+        self._rows_cache = rows if rows is not None else []
+        self.result_tree.set_data(columns, self._rows_cache)
 
     def _current_db_id(self) -> Optional[int]:
         name = self.cmb_db.get().strip()
@@ -216,7 +514,11 @@ class TabLibrary(ttk.Frame):
         return self._db_id_by_name.get(name)
 
     def _fill_db_filter(self):
-        choices = self.get_db_choices()  # [(id, name)]
+        now = time.monotonic()
+        if self._db_choices_cache is not None and now - self._db_choices_mtime < self.DB_CHOICES_TTL:
+            return  # комбобокс уже заполнен этим списком
+        choices = self._db_choices_cache = self.get_db_choices()  # [(id, name)]
+        self._db_choices_mtime = now
         self._db_id_by_name = {name: did for did, name in choices}
         values = ["All"] + [name for _, name in choices]
         self.cmb_db["values"] = values
@@ -224,17 +526,11 @@ class TabLibrary(ttk.Frame):
             self.cmb_db.set("All")
 
     def _saved_selected_id(self) -> int | None:
-        sel = self.tbl_saved.selection()
-        if not sel:
+        # iid строк виджета — слоты VirtualTree, выделение храним индексом в кэше
+        idx = self._saved_view.selected_index()
+        if idx is None or idx >= len(self._saved_cache):
             return None
-        # у нас есть кэш – найдём объект по iid или по индексу
-        iid = sel[0]
-        # попробуем сопоставить по id
-        for q in self._saved_cache:
-            if str(q.get("id")) == iid:
-                return int(q["id"])
-        # fallback: по позиции
-        idx = self.tbl_saved.index(iid)
-        return int(self._saved_cache[idx]["id"])
+        q = self._saved_cache[idx]  # None — страница ещё не дочитана
+        return q.id if q is not None else None
 
 
@@ -0,0 +1,26 @@
+import unittest
+
+from app.state.query_builder_state import QueryBuilderState
+
+
+class CoerceTest(unittest.TestCase):
+    def test_numbers(self):
+        cases = {
+            "5": 5, " 5 ": 5, "+3": 3, "-3": -3,
+            ".5": 0.5, "5.": 5.0, "1e5": 100000.0, "-1.5E-3": -0.0015,
+        }
+        for raw, expected in cases.items():
+            with self.subTest(raw=raw):
+                value = QueryBuilderState._coerce(raw)
+                self.assertEqual(value, expected)
+                self.assertIs(type(value), type(expected))
+
+    def test_strings(self):
+        for raw in ("abc", "1 2", "inf", "nan", "1_000", " x "):
+            with self.subTest(raw=raw):
+                self.assertEqual(QueryBuilderState._coerce(raw), raw)
+        self.assertEqual(QueryBuilderState._coerce(None), "")
+
+
+if __name__ == "__main__":
+    unittest.main()